@@ -1,12 +1,31 @@
 
+import importlib
 import streamlit as st
-import pandas as pd
-from pathlib import Path
-import datetime
 from datetime import datetime as dt, timedelta
-import io
-import bcrypt
 import uuid
+import threading
+import perf
+
+class lazy:
+    # module pas importeren bij het eerste gebruik: de loginpagina komt zo op het scherm zonder
+    # pandas/openpyxl te laden (koude start). Bewust geen LazyLoader in sys.modules: Streamlit
+    # overloopt bij het eerste element alle modules (inspect.stack) en zou ze zo toch laden.
+    def __init__(self, name):
+        self._name, self._module = name, None
+
+    def __getattr__(self, attr):
+        if self._module is None: self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+pd = lazy("pandas")
+auth = lazy("auth")
+storage = lazy("storage")
+backup = lazy("backup")
+bulk = lazy("bulk")
+exports = lazy("exports")
+dives = lazy("dives")
+settlement = lazy("settlement")
+audit = lazy("audit")
 
 USERS_FILE    = "users.xlsx"
 DUIKERS_FILE  = "duikers.xlsx"
@@ -37,59 +56,165 @@ st.markdown(
 )
 
 def init_file(file, columns, defaults=None):
-    p = Path(file)
-    if not p.exists():
-        df = pd.DataFrame(defaults, columns=columns) if defaults is not None else pd.DataFrame(columns=columns)
-        df.to_excel(file, index=False, engine="openpyxl")
-    return pd.read_excel(file, engine="openpyxl")
+    with perf.span("init_file", file=file) as s:
+        df = storage.get_backend().read(file, columns, defaults)
+        s.note(rows=len(df))
+    return df
 
+# Schrijfacties gaan via de gedeelde schrijver (één thread per proces, gebundeld en
+# onder het bestandsslot); de aanroeper wacht tot zijn actie effectief weggeschreven is.
 def save_file(file, df):
-    df.to_excel(file, index=False, engine="openpyxl")
+    with perf.span("save_file", file=file, rows=len(df)): storage.get_writer().write(file, df).result()
 
-@st.cache_data(show_spinner=False)
-def load_users():
-    df = init_file(USERS_FILE, ["Username","Password","Role"], defaults=[["admin","1234","admin"]])
+def append_rows(file, rows):
+    with perf.span("append_rows", file=file, rows=len(rows)): storage.get_writer().append(file, rows).result()
+
+def delete_rows(file, ids, rows=None):
+    with perf.span("delete_rows", file=file, rows=len(ids)): return storage.get_writer().delete(file, ids, rows).result()
+
+@st.cache_resource
+def cache_stats():
+    return {"lock": threading.Lock(), "calls": {}, "misses": {}}
+
+def _tel(kind, loader):
+    stats = cache_stats()
+    with stats["lock"]: stats[kind][loader] = stats[kind].get(loader, 0) + 1
+    if kind == "misses": perf.note(cache="miss")
+
+def _loaded(name, loader, file):
+    # span rond een loader: standaard een hit, de cachefunctie zelf meldt een miss via _tel
+    _tel("calls", name)
+    with perf.span(name, cache="hit") as s:
+        out = loader(dataset_version(file))
+        s.note(rows=len(out))
+    return out
+
+def dataset_version(file):
+    return storage.get_backend().version(file)
+
+# Elke loader is gesleuteld op de versie van zijn eigen dataset: een schrijfactie
+# maakt enkel die dataset ongeldig, de andere blijven uit de cache komen.
+USERS_COLUMNS = ["Username","Password","Role"]
+USERS_DEFAULTS = [["admin","1234","admin"]]
+
+def _users_frame(df):
     for col, default in [("PasswordHash",""),("FailedAttempts",0),("LockedUntil","")]:
         if col not in df.columns: df[col] = default
     for col in ["Username","Password","PasswordHash","Role","FailedAttempts","LockedUntil"]:
         if col not in df.columns: df[col] = "" if col != "FailedAttempts" else 0
     return df[["Username","Password","PasswordHash","Role","FailedAttempts","LockedUntil"]]
 
-def persist_users(df):
+@st.cache_data(show_spinner=False, max_entries=2)
+def _load_users(version):
+    _tel("misses", "load_users")
+    return _users_frame(init_file(USERS_FILE, USERS_COLUMNS, defaults=USERS_DEFAULTS))
+
+def load_users():
+    return _loaded("load_users", _load_users, USERS_FILE)
+
+def _users_out(df):
     out = df.copy()
     if "Password" in out.columns: out["Password"] = ""
-    save_file(USERS_FILE, out[["Username","PasswordHash","Role","FailedAttempts","LockedUntil"]])
+    return out[["Username","PasswordHash","Role","FailedAttempts","LockedUntil"]]
+
+def update_users(fn):
+    # lezen-wijzigen-schrijven in de schrijver: gelijktijdige logins overschrijven elkaar niet
+    def run(df):
+        df = _users_frame(df.reset_index(drop=True))
+        result = fn(df)
+        return _users_out(df), result
+    with perf.span("update_users", file=USERS_FILE):
+        return storage.get_writer().modify(USERS_FILE, run, USERS_COLUMNS, USERS_DEFAULTS).result()
+
+@st.cache_data(show_spinner=False, max_entries=2)
+def _load_duikers(version): _tel("misses", "load_duikers"); return init_file(DUIKERS_FILE, ["Naam"])
+@st.cache_data(show_spinner=False, max_entries=2)
+def _load_places(version): _tel("misses", "load_places"); return init_file(PLACES_FILE, ["Plaats"])
+# De duikentabel wordt één keer per versie genormaliseerd en als gedeeld object
+# (cache_resource, geen kopie per sessie) aan alle pagina's gegeven.
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _load_duiken(version): _tel("misses", "load_duiken"); return dives.DiveTable(init_file(DUIKEN_FILE, ["Datum","Plaats","Duiker"]))
+
+def load_duikers(): return _loaded("load_duikers", _load_duikers, DUIKERS_FILE)
+def load_places(): return _loaded("load_places", _load_places, PLACES_FILE)
+def load_duiken(): return _loaded("load_duiken", _load_duiken, DUIKEN_FILE)
+
+DATA_FILES = [USERS_FILE, DUIKERS_FILE, PLACES_FILE, DUIKEN_FILE]
+
+# Eén backupplanner per serverproces (achtergrondthread), gestart bij de eerste sessie.
+@st.cache_resource
+def backup_scheduler(): return backup.Scheduler(DATA_FILES)
+
+LOADERS = [("load_users", USERS_FILE), ("load_duikers", DUIKERS_FILE), ("load_places", PLACES_FILE), ("load_duiken", DUIKEN_FILE),
+           ("load_settlement", DUIKEN_FILE)]
+
+# Afrekening-tellers per (dag, plaats, duiker): één object per serverproces, bij elke
+# opslag/verwijdering bijgewerkt; enkel bij een onverwachte versie (bv. ander proces) herbouwd.
+@st.cache_resource
+def settlement_aggregate():
+    agg = settlement.SettlementAggregate()
+    def on_write(file, before, after, added, removed):
+        if file == DUIKEN_FILE: agg.apply(before, after, added=added, removed=removed)
+    storage.get_writer().listeners.append(on_write)
+    return agg
+
+def load_settlement():
+    _tel("calls", "load_settlement")
+    agg = settlement_aggregate(); version = dataset_version(DUIKEN_FILE)
+    with perf.span("load_settlement", cache="hit"):
+        if agg.version != version:
+            # de tabel buiten agg.lock laden: het lezen wacht op de bestandslock, en de schrijver
+            # die die houdt, kan in zijn listener op agg.lock wachten
+            tbl = _load_duiken(version)
+            with agg.lock:
+                if agg.version != version: _tel("misses", "load_settlement"); agg.rebuild(tbl, version)
+    return agg
 
-@st.cache_data(show_spinner=False)
-def load_duikers(): return init_file(DUIKERS_FILE, ["Naam"])
-@st.cache_data(show_spinner=False)
-def load_places(): return init_file(PLACES_FILE, ["Plaats"])
-@st.cache_data(show_spinner=False)
-def load_duiken(): return init_file(DUIKEN_FILE, ["Datum","Plaats","Duiker"])
+# De tellers volgen via de listener van de schrijver; hier enkel zorgen dat die geregistreerd is.
+def save_duiken(rows):
+    settlement_aggregate()
+    append_rows(DUIKEN_FILE, rows)
 
-def refresh_all():
-    load_users.clear(); load_duikers.clear(); load_places.clear(); load_duiken.clear()
+def remove_duiken(ids):
+    settlement_aggregate()
+    tbl = load_duiken()
+    rows = dives.DiveTable.to_frame(tbl.df[tbl.df["RowId"].isin(ids)])
+    deleted = delete_rows(DUIKEN_FILE, ids, rows=rows)
+    if deleted:
+        gone = rows.loc[rows.index.isin(deleted)]
+        audit_event("duiken_verwijderd", f"{len(deleted)} rij(en): " + "; ".join(
+            f"{d.isoformat()} · {p} · {n}" for d, p, n in gone[["Datum","Plaats","Duiker"]].head(50).itertuples(index=False, name=None)))
+    return len(deleted)
 
 def verify_password(row, password: str) -> bool:
     ph = str(row.get("PasswordHash","") or "")
-    if ph:
-        try:
-            return bcrypt.checkpw(password.encode("utf-8"), ph.encode("utf-8"))
-        except Exception:
-            return False
+    if ph: return auth.check_password(password, ph)
     pw = str(row.get("Password","") or "")
     return pw == password
 
-def set_password(users_df, username, new_password):
-    hashed = bcrypt.hashpw(new_password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+def set_password(username, new_password):
+    hashed = auth.hash_password(new_password)
+    update_users(lambda users_df: _set_hash(users_df, username, hashed))
+    clear_lock(username)
+
+def _set_hash(users_df, username, hashed):
     users_df.loc[users_df["Username"]==username, "PasswordHash"] = hashed
     if "Password" in users_df.columns: users_df.loc[users_df["Username"]==username, "Password"] = ""
-    users_df.loc[users_df["Username"]==username, "FailedAttempts"] = 0
-    users_df.loc[users_df["Username"]==username, "LockedUntil"] = ""
-    persist_users(users_df); refresh_all()
 
-def is_locked(row):
-    lu = str(row.get("LockedUntil","") or "")
+def add_user(username, hashed, role):
+    def run(users_df):
+        if username in users_df["Username"].astype(str).tolist(): return False
+        users_df.loc[len(users_df)] = {"Username":username,"Password":"","PasswordHash":hashed,"Role":role,"FailedAttempts":0,"LockedUntil":""}
+        return True
+    return update_users(run)
+
+# Foute pogingen/blokkeringen zitten in de throttle-store (auth.py), niet in het gebruikersbestand;
+# bij de eerste start worden de tellers uit het bestand eenmalig overgenomen.
+def throttle():
+    return auth.get_throttle(seed=lambda: load_users()[["Username","FailedAttempts","LockedUntil"]].itertuples(index=False))
+
+def is_locked(username):
+    _, lu = throttle().state(username)
     if not lu: return False, None
     try:
         until = dt.fromisoformat(lu)
@@ -98,22 +223,16 @@ def is_locked(row):
     except Exception:
         return False, None
 
-def register_failed_attempt(users_df, username):
-    users_df.loc[users_df["Username"]==username, "FailedAttempts"] = users_df.loc[users_df["Username"]==username, "FailedAttempts"].astype(int) + 1
-    attempts = int(users_df.loc[users_df["Username"]==username, "FailedAttempts"].iloc[0])
-    locked_until = ""
-    if attempts >= MAX_ATTEMPTS:
-        until = dt.utcnow() + timedelta(minutes=LOCK_MINUTES)
-        locked_until = until.isoformat(timespec="seconds")
-        users_df.loc[users_df["Username"]==username, "LockedUntil"] = locked_until
-        users_df.loc[users_df["Username"]==username, "FailedAttempts"] = 0
-    persist_users(users_df); refresh_all()
-    return attempts, locked_until
-
-def clear_lock(users_df, username):
-    users_df.loc[users_df["Username"]==username, "FailedAttempts"] = 0
-    users_df.loc[users_df["Username"]==username, "LockedUntil"] = ""
-    persist_users(users_df); refresh_all()
+def register_failed_attempt(username):
+    return throttle().fail(username, MAX_ATTEMPTS, LOCK_MINUTES)
+
+def clear_lock(username):
+    throttle().clear(username)
+
+# Audittrail: enkel in de buffer van audit.py zetten, de audit-thread schrijft weg (blokkeert niet)
+def audit_event(action, details="", user=None):
+    if user is None: user = st.session_state.get("username", "")
+    audit.get_log().log(action, user, details, st.session_state.get("session_id", ""))
 
 def login_page():
     st.markdown(
@@ -131,23 +250,30 @@ def login_page():
     if st.button("Login", type="primary", use_container_width=True, key="login_btn"):
         users = load_users()
         if u not in users["Username"].astype(str).tolist():
+            audit_event("login_onbekend", user=u)
             st.error("Onbekende gebruiker")
         else:
             row = users[users["Username"]==u].iloc[0]
-            locked, until = is_locked(row)
+            locked, until = is_locked(u)
             if locked:
+                audit_event("login_geblokkeerd", f"geblokkeerd tot {until.isoformat(timespec='seconds')} UTC", user=u)
                 st.error(f"Account geblokkeerd tot {until.strftime('%Y-%m-%d %H:%M:%S')} UTC.")
             else:
                 if verify_password(row, p):
-                    if str(row.get("Password","") or "") != "":
-                        set_password(users, u, p)
-                    clear_lock(users, u)
+                    # enkel schrijven als er iets te veranderen is: platte tekst/andere kostfactor omzetten, pogingen wissen
+                    if str(row.get("Password","") or "") != "" or auth.needs_rehash(str(row.get("PasswordHash","") or "")):
+                        set_password(u, p)
+                    elif throttle().state(u) != (0, ""):
+                        clear_lock(u)
                     st.session_state.logged_in = True
                     st.session_state.username = u
                     st.session_state.role = row["Role"]
+                    audit_event("login", user=u)
                     st.rerun()
                 else:
-                    attempts, locked_until = register_failed_attempt(users, u)
+                    attempts, locked_until = register_failed_attempt(u)
+                    audit_event("geblokkeerd" if locked_until else "login_mislukt",
+                                f"tot {locked_until} UTC" if locked_until else f"poging {attempts}", user=u)
                     if locked_until:
                         st.error(f"Teveel foute pogingen. Geblokkeerd tot {locked_until} UTC.")
                     else:
@@ -155,6 +281,28 @@ def login_page():
                         st.error(f"Onjuist wachtwoord. Nog {left} poging(en) over.")
     st.markdown("</div>", unsafe_allow_html=True)
 
+def keep(key, options=None):
+    # Alleen de actieve pagina wordt getekend, en Streamlit ruimt de state op van widgets
+    # die in een run niet voorkomen. Bij terugkeer zetten we de laatst gekende waarde terug.
+    saved = st.session_state.setdefault("page_state", {})
+    if key in st.session_state: saved[key] = st.session_state[key]
+    elif key in saved:
+        v = saved[key]
+        if options is None or all(x in options for x in (v if isinstance(v, list) else [v])): st.session_state[key] = v
+    return key
+
+def keep_range(key, lo, hi):
+    # Datumrange standaard over alle data. Groeit de data (lo/hi verschuiven), dan schuiven de grenzen
+    # mee die nog op de vorige data-grens stonden; een grens die de gebruiker zelf koos, blijft staan.
+    keep(key)
+    bounds = st.session_state.setdefault("range_bounds", {})
+    old, cur = bounds.get(key), st.session_state.get(key)
+    if cur is None: st.session_state[key] = (lo, hi)
+    elif old is not None and old != (lo, hi) and isinstance(cur, tuple) and len(cur) == 2:
+        st.session_state[key] = (lo if cur[0] == old[0] else cur[0], hi if cur[1] == old[1] else cur[1])
+    bounds[key] = (lo, hi)
+    return key
+
 def appbar(suffix: str):
     col1, col2, col3 = st.columns([6,2,2])
     with col1:
@@ -163,7 +311,7 @@ def appbar(suffix: str):
         st.markdown(f"<div class='badge'>{st.session_state.get('username','?')} · {st.session_state.get('role','?')}</div>", unsafe_allow_html=True)
     with col3:
         if st.button("Uitloggen", key=f"logout_{suffix}"):
-            st.session_state.clear(); st.rerun()
+            audit_event("uitloggen"); st.session_state.clear(); st.rerun()
 
 def page_duiken():
     appbar("duiken")
@@ -173,27 +321,29 @@ def page_duiken():
     duikers_df = load_duikers().copy(); places_df = load_places().copy()
     plaatsen_list = places_df["Plaats"].dropna().astype(str).tolist() if not places_df.empty else []
     place_options = ["— kies —"] + plaatsen_list
-    datum = st.date_input("Datum", datetime.date.today(), key="duiken_datum", format="DD/MM/YYYY")
+    datum = st.date_input("Datum", key=keep("duiken_datum"), format="DD/MM/YYYY")
     if st.session_state.last_duik_date is None or st.session_state.last_duik_date != datum:
         if st.session_state.last_duik_date is not None:
             st.session_state["duiken_plaats"] = place_options[0]
             st.session_state["duiken_sel_duikers"] = []
         st.session_state.last_duik_date = datum
-    plaats = st.selectbox("Duikplaats", place_options, index=0, key="duiken_plaats")
+    plaats = st.selectbox("Duikplaats", place_options, index=0, key=keep("duiken_plaats", place_options))
     if role == "admin":
         with st.expander("Duikplaats toevoegen", expanded=(len(plaatsen_list)==0)):
             np = st.text_input("Nieuwe duikplaats", key="duiken_nieuwe_plaats")
             if st.button("Voeg duikplaats toe", key="duiken_btn_plaats_toevoegen"):
                 if np and np not in plaatsen_list:
-                    places_df.loc[len(places_df)] = [np]; save_file(PLACES_FILE, places_df); refresh_all(); st.success(f"Duikplaats '{np}' toegevoegd."); st.rerun()
+                    append_rows(PLACES_FILE, pd.DataFrame({"Plaats":[np]})); audit_event("duikplaats_toegevoegd", np)
+                    st.success(f"Duikplaats '{np}' toegevoegd."); st.rerun()
                 else: st.warning("Voer een unieke naam in.")
     duikers = duikers_df["Naam"].dropna().astype(str).tolist() if not duikers_df.empty else []
-    sel = st.multiselect("Kies duikers", duikers, key="duiken_sel_duikers")
+    sel = st.multiselect("Kies duikers", duikers, key=keep("duiken_sel_duikers", duikers))
     if role == "admin":
         nd = st.text_input("Nieuwe duiker toevoegen", key="duiken_nieuwe_duiker")
         if st.button("Voeg duiker toe", key="duiken_btn_duiker_toevoegen"):
             if nd and nd not in duikers:
-                duikers_df.loc[len(duikers_df)] = [nd]; save_file(DUIKERS_FILE, duikers_df); refresh_all(); st.success(f"Duiker '{nd}' toegevoegd."); st.rerun()
+                append_rows(DUIKERS_FILE, pd.DataFrame({"Naam":[nd]})); audit_event("duiker_toegevoegd", nd)
+                st.success(f"Duiker '{nd}' toegevoegd."); st.rerun()
             else: st.warning("Voer een unieke naam in.")
     st.markdown("##### Geselecteerde duikers (nog niet opgeslagen)")
     if sel:
@@ -206,66 +356,141 @@ def page_duiken():
         st.markdown("<span class='hint'>Nog geen duikers geselecteerd.</span>", unsafe_allow_html=True)
     can_save = (plaats != "— kies —") and (len(sel) > 0)
     if st.button("Opslaan duik(en)", type="primary", disabled=(not can_save), key="duiken_opslaan"):
-        duiken_df = load_duiken().copy()
-        for naam in sel: duiken_df.loc[len(duiken_df)] = [datum, plaats, naam]
-        duiken_df["Datum"] = pd.to_datetime(duiken_df["Datum"]).dt.date
-        save_file(DUIKEN_FILE, duiken_df); refresh_all()
+        save_duiken(pd.DataFrame({"Datum":[datum]*len(sel), "Plaats":[plaats]*len(sel), "Duiker":sel}))
+        audit_event("duiken_opgeslagen", f"{datum.isoformat()} · {plaats}: {', '.join(sel)}")
         st.success(f"{len(sel)} duik(en) opgeslagen voor {plaats} op {datum.strftime('%d/%m/%Y')}.")
     if plaats != "— kies —":
-        duiken_df2 = load_duiken().copy()
-        if not duiken_df2.empty:
-            duiken_df2["Datum"] = pd.to_datetime(duiken_df2["Datum"]).dt.date
-            mask = (duiken_df2["Datum"]==datum) & (duiken_df2["Plaats"]==plaats)
-            huidige = duiken_df2.loc[mask].copy()
+        tbl = load_duiken()
+        if not tbl.empty:
+            huidige = tbl.by_date_place(datum, plaats)
             st.markdown("##### Bestaande inschrijvingen voor deze duik")
             if huidige.empty:
                 st.markdown("<span class='hint'>Nog geen opgeslagen inschrijvingen voor deze datum/plaats.</span>", unsafe_allow_html=True)
             else:
-                huidige_view = huidige[["Duiker"]].rename(columns={"Duiker":"Aanwezige duiker"})
+                huidige_view = pd.DataFrame({"Aanwezige duiker": huidige["Duiker"].astype(str).to_numpy()})
                 st.dataframe(huidige_view, use_container_width=True, hide_index=True, key="duiken_huidige_table")
-                rm_saved = st.multiselect("Selecteer duikers om te verwijderen uit deze duik", huidige["Duiker"].unique().tolist(), key="duiken_rm_saved")
+                rm_saved = st.multiselect("Selecteer duikers om te verwijderen uit deze duik", [str(d) for d in huidige["Duiker"].unique()], key="duiken_rm_saved")
                 if st.button("Verwijder geselecteerde uit deze duik", key="duiken_btn_rm_saved"):
-                    duiken_df2 = duiken_df2[~(mask & duiken_df2["Duiker"].isin(rm_saved))]
-                    save_file(DUIKEN_FILE, duiken_df2); refresh_all()
-                    st.success(f"Verwijderd: {len(rm_saved)} uit {plaats} op {datum.strftime('%d/%m/%Y')}.")
+                    n = remove_duiken(huidige.loc[huidige["Duiker"].isin(rm_saved), "RowId"].tolist())
+                    st.success(f"Verwijderd: {n} uit {plaats} op {datum.strftime('%d/%m/%Y')}.")
                     st.experimental_rerun()
 
+def overzicht_selectie(tbl, keuze, start, end, pf, dfilt):
+    if keuze is not None: return tbl.by_date_place(*keuze)
+    return tbl.select(start, end, plaats=None if pf=="Alle" else pf, duiker=None if dfilt=="Alle" else dfilt)
+
+# Exports worden pas gebouwd als erom gevraagd wordt, en onthouden per filter + dataversie
+@st.cache_data(show_spinner=False, max_entries=8)
+def export_overzicht(version, selectie, fmt):
+    with perf.span(f"export:overzicht_{fmt}") as s:
+        f = dives.DiveTable.to_frame(dives.DiveTable.ordered(overzicht_selectie(_load_duiken(version), *selectie)))
+        s.note(rows=len(f))
+        return exports.frame_csv(f) if fmt == "csv" else exports.frame_xlsx(f, "Duiken")
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def export_afrekening(version, start, end, pf, bedrag):
+    with perf.span("export:afrekening") as s:
+        sub = _load_duiken(version).select(start, end, plaats=None if pf=="Alle" else pf)
+        s.note(rows=len(sub))
+        return exports.settlement_xlsx(dives.DiveTable.to_frame(dives.DiveTable.ordered(sub)), bedrag)
+
+# Gesorteerde selectie gedeeld over sessies; per rerun wordt enkel de zichtbare pagina geserialiseerd
+@st.cache_resource(show_spinner=False, max_entries=16)
+def overzicht_sorted(version, selectie, sort, desc):
+    return dives.DiveTable.ordered(overzicht_selectie(_load_duiken(version), *selectie), sort, desc)
+
+# Bulkimport: het plan (inlezen + controle) per bestand en per versie van de namenlijsten,
+# de hashes van de bestaande duiken per dataversie
+@st.cache_data(show_spinner="Bestand controleren…", max_entries=2)
+def import_plan(name, data, duikers_version, places_version):
+    with perf.span("import:controle") as s:
+        plan = bulk.ImportPlan(bulk.read_upload(name, data), _names(load_duikers(), "Naam"), _names(load_places(), "Plaats"))
+        s.note(rows=plan.total)
+    return plan
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def duiken_keys(version):
+    return bulk.table_keys(_load_duiken(version))
+
+def _names(df, col):
+    return df[col].dropna().astype(str).tolist() if not df.empty else []
+
+def import_duiken(rows, new_divers, new_places):
+    # nieuwe namen en duiken samen indienen: de schrijver verwerkt ze in één batch onder één slot
+    writer = storage.get_writer()
+    with perf.span("import:schrijven", rows=len(rows)):
+        pending = []
+        if new_divers: pending.append(writer.append(DUIKERS_FILE, pd.DataFrame({"Naam": new_divers})))
+        if new_places: pending.append(writer.append(PLACES_FILE, pd.DataFrame({"Plaats": new_places})))
+        if len(rows): save_duiken(rows)
+        for fut in pending: fut.result()
+
+def backup_zip(sid):
+    with perf.span("backup:zip"): return backup.zip_path(sid).read_bytes()
+
+def export_buttons(prefix, export_key, downloads):
+    if st.session_state.get(f"{prefix}_export_key") != export_key:
+        if st.button("Export voorbereiden", key=f"{prefix}_export"):
+            st.session_state[f"{prefix}_export_key"] = export_key; st.rerun()
+        return
+    for label, build, file_name, mime, key in downloads:
+        st.download_button(label, data=build(), file_name=file_name, mime=mime, key=key)
+
 def page_overzicht():
     appbar("overzicht")
-    df = load_duiken().copy()
-    if df.empty: st.info("Nog geen duiken geregistreerd."); return
-    df["Datum"] = pd.to_datetime(df["Datum"]).dt.date
-    unique_duiken = df.dropna(subset=["Plaats"]).copy()
-    unique_duiken = unique_duiken.drop_duplicates(subset=["Datum","Plaats"]).sort_values("Datum", ascending=False)
-    duik_labels = [f"{d.strftime('%d/%m/%Y')} · {p}" for d,p in zip(unique_duiken["Datum"], unique_duiken["Plaats"])]
-    keuze = st.selectbox("Specifieke duik (optioneel)", ["Alle duiken"] + duik_labels, index=0, key="overzicht_specifieke_duik")
+    tbl = load_duiken()
+    if len(tbl.invalid):
+        st.warning(f"{len(tbl.invalid)} duik(en) zonder geldige datum worden niet getoond en tellen niet mee in de afrekening.")
+        with st.expander("Duiken zonder geldige datum"): st.dataframe(tbl.invalid.astype(str), use_container_width=True)
+    if tbl.empty: st.info("Nog geen duiken geregistreerd."); return
+    unique_duiken = tbl.occasions
+    duik_labels = [f"{d.strftime('%d/%m/%Y')} · {p}" for d,p in unique_duiken]
+    keuze = st.selectbox("Specifieke duik (optioneel)", ["Alle duiken"] + duik_labels, index=0, key=keep("overzicht_specifieke_duik", ["Alle duiken"] + duik_labels))
     c1,c2,c3 = st.columns([1,1,2])
     with c1:
-        min_d,max_d = df["Datum"].min(), df["Datum"].max()
-        rng = st.date_input("Datumrange", (min_d,max_d), key="overzicht_range", format="DD/MM/YYYY")
+        rng = st.date_input("Datumrange", key=keep_range("overzicht_range", tbl.min_date, tbl.max_date), format="DD/MM/YYYY")
     with c2:
-        plaatsen = ["Alle"] + sorted(df["Plaats"].dropna().unique().tolist())
-        pf = st.selectbox("Duikplaats", plaatsen, index=0, key="overzicht_plaats")
+        plaatsen = ["Alle"] + tbl.places
+        pf = st.selectbox("Duikplaats", plaatsen, index=0, key=keep("overzicht_plaats", plaatsen))
     with c3:
-        duikers = ["Alle"] + sorted(df["Duiker"].dropna().unique().tolist() if not df.empty else [])
-        dfilt = st.selectbox("Duiker", duikers, index=0, key="overzicht_duiker")
+        duikers = ["Alle"] + tbl.divers
+        dfilt = st.selectbox("Duiker", duikers, index=0, key=keep("overzicht_duiker", duikers))
     if keuze != "Alle duiken":
-        idx = duik_labels.index(keuze)
-        target_d = unique_duiken.iloc[idx]["Datum"]
-        target_p = unique_duiken.iloc[idx]["Plaats"]
-        f = df[(df["Datum"]==target_d) & (df["Plaats"]==target_p)].copy()
+        selectie = (unique_duiken[duik_labels.index(keuze)], None, None, None, None)
     else:
-        start,end = rng if isinstance(rng, tuple) else (df["Datum"].min(), df["Datum"].max())
-        f = df[(df["Datum"]>=start)&(df["Datum"]<=end)].copy()
-        if pf!="Alle": f = f[f["Plaats"]==pf]
-        if dfilt!="Alle": f = f[f["Duiker"]==dfilt]
-    f = f.sort_values(["Datum","Plaats","Duiker"])
-    view = f.copy()
-    view["Datum"] = pd.to_datetime(view["Datum"]).dt.strftime("%d/%m/%Y")
-    f_with_id = f.reset_index().rename(columns={"index":"RowId"})
-    view_with_id = f_with_id.copy()
+        start,end = rng if isinstance(rng, tuple) else (tbl.min_date, tbl.max_date)
+        selectie = (None, start, end, pf, dfilt)
+    version = dataset_version(DUIKEN_FILE)
+    # De selectie (stabiele RowIds) geldt over alle pagina's van één filter; een nieuw filter begint leeg.
+    if st.session_state.get("overzicht_sel_filter") != selectie:
+        st.session_state.overzicht_sel_filter = selectie
+        st.session_state.overzicht_selected = set()
+        st.session_state["overzicht_page"] = 1
+    selected = st.session_state.overzicht_selected
+    p1,p2,p3,p4 = st.columns(4)
+    with p1:
+        if keep("overzicht_page_size") not in st.session_state: st.session_state["overzicht_page_size"] = 50
+        size = st.selectbox("Rijen per pagina", [25,50,100,250], key="overzicht_page_size")
+    with p2:
+        sort = st.selectbox("Sorteer op", ["Datum","Plaats","Duiker"], index=0, key=keep("overzicht_sort", ["Datum","Plaats","Duiker"]))
+    with p3:
+        desc = st.checkbox("Aflopend", key=keep("overzicht_sort_desc"))
+    rows = overzicht_sorted(version, selectie, sort, desc)
+    pages = max(1, -(-len(rows) // size))
+    with p4:
+        if keep("overzicht_page") not in st.session_state or st.session_state["overzicht_page"] > pages: st.session_state["overzicht_page"] = 1
+        page = st.number_input("Pagina", min_value=1, max_value=pages, step=1, key="overzicht_page")
+    view_with_id = dives.DiveTable.to_frame(rows.iloc[(page-1)*size:page*size]).reset_index().rename(columns={"index":"RowId"})
     view_with_id["Datum"] = pd.to_datetime(view_with_id["Datum"]).dt.strftime("%d/%m/%Y")
-    view_with_id.insert(0, "Selecteer", False)
+    # Vinkjes van deze pagina één keer uit de selectie overnemen; zolang de pagina dezelfde blijft,
+    # blijven de data (en dus de bewerkingen in de data_editor) ongewijzigd.
+    sig = (version, selectie, sort, desc, page, size)
+    if st.session_state.get("overzicht_slice_sig") != sig:
+        if st.session_state.get("overzicht_slice_sig") is not None and st.session_state.overzicht_slice_sig[0] != version and selected:
+            selected.intersection_update(rows["RowId"][rows["RowId"].isin(list(selected))].tolist())
+        st.session_state.overzicht_slice_sig = sig
+        st.session_state.overzicht_slice_sel = [rid in selected for rid in view_with_id["RowId"]]
+    view_with_id.insert(0, "Selecteer", st.session_state.overzicht_slice_sel)
     st.markdown("##### Overzicht (selecteer rijen om te verwijderen)")
     edited = st.data_editor(
         view_with_id,
@@ -274,60 +499,68 @@ def page_overzicht():
         hide_index=True,
         column_config={
             "Selecteer": st.column_config.CheckboxColumn("Selecteer", help="Vink aan om te verwijderen"),
-        }
+        },
+        # teller in de sleutel: na wissen/verwijderen een nieuwe editor, anders zet Streamlit de oude vinkjes terug
+        key=f"overzicht_editor_{st.session_state.get('overzicht_editor_round', 0)}",
     )
-    to_delete_ids = edited.loc[edited["Selecteer"]==True, "RowId"].tolist()
-    if st.button("Verwijder geselecteerde rijen", disabled=(len(to_delete_ids)==0), key="overzicht_delete_rows"):
-        real = load_duiken().copy()
-        real["Datum"] = pd.to_datetime(real["Datum"]).dt.date
-        remain = real.drop(index=to_delete_ids, errors="ignore")
-        save_file(DUIKEN_FILE, remain); refresh_all()
-        st.success(f"Verwijderd: {len(to_delete_ids)} rij(en).")
-        st.experimental_rerun()
-    out = io.BytesIO()
-    with pd.ExcelWriter(out, engine="openpyxl") as w: f.to_excel(w, index=False, sheet_name="Duiken")
-    st.download_button("Download CSV (huidige filter)", data=f.to_csv(index=False).encode("utf-8"),
-        file_name="duiken_export.csv", mime="text/csv", key="overzicht_csv")
-    st.download_button("Download Excel (huidige filter)", data=out.getvalue(), file_name="duiken_export.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", key="overzicht_xlsx")
+    for rid, checked in zip(edited["RowId"], edited["Selecteer"]):
+        if checked: selected.add(int(rid))
+        else: selected.discard(int(rid))
+    st.markdown(f"<span class='hint'>Pagina {page} van {pages} · {len(rows)} rij(en) in filter · {len(selected)} geselecteerd over alle pagina's</span>", unsafe_allow_html=True)
+    cd1, cd2 = st.columns([1,3])
+    with cd1:
+        if st.button("Verwijder geselecteerde rijen", disabled=(len(selected)==0), key="overzicht_delete_rows"):
+            n = remove_duiken(sorted(selected)); selected.clear()
+            st.session_state.overzicht_editor_round = st.session_state.get("overzicht_editor_round", 0) + 1
+            st.success(f"Verwijderd: {n} rij(en).")
+            st.experimental_rerun()
+    with cd2:
+        if st.button("Selectie wissen", disabled=(len(selected)==0), key="overzicht_clear_sel"):
+            selected.clear(); st.session_state.overzicht_slice_sig = None
+            st.session_state.overzicht_editor_round = st.session_state.get("overzicht_editor_round", 0) + 1
+            st.rerun()
+    export_buttons("overzicht", (version, selectie), [
+        ("Download CSV (huidige filter)", lambda: export_overzicht(version, selectie, "csv"), "duiken_export.csv", "text/csv", "overzicht_csv"),
+        ("Download Excel (huidige filter)", lambda: export_overzicht(version, selectie, "xlsx"), "duiken_export.xlsx", exports.XLSX_MIME, "overzicht_xlsx"),
+    ])
 
 def page_afrekening():
     appbar("afrekening")
-    df = load_duiken().copy()
-    if df.empty: st.info("Nog geen duiken geregistreerd."); return
-    df["Datum"] = pd.to_datetime(df["Datum"]).dt.date
+    agg = load_settlement()
+    if agg.skipped: st.warning(f"{agg.skipped} duik(en) zonder geldige datum tellen niet mee; zie Overzicht.")
+    if agg.empty: st.info("Nog geen duiken geregistreerd."); return
     c1,c2,c3 = st.columns(3)
     with c1:
-        min_d,max_d = df["Datum"].min(), df["Datum"].max()
-        rng = st.date_input("Periode", (min_d,max_d), key="afr_range", format="DD/MM/YYYY")
+        min_d,max_d = agg.min_date, agg.max_date
+        rng = st.date_input("Periode", key=keep_range("afr_range", min_d, max_d), format="DD/MM/YYYY")
     with c2:
-        bedrag = st.number_input("Bedrag per duik (€)", min_value=0.0, step=1.0, value=5.0, key="afr_bedrag")
+        if keep("afr_bedrag") not in st.session_state: st.session_state["afr_bedrag"] = 5.0
+        bedrag = st.number_input("Bedrag per duik (€)", min_value=0.0, step=1.0, key="afr_bedrag")
     with c3:
-        pf = st.selectbox("Duikplaats (optioneel)", ["Alle"] + sorted(df["Plaats"].dropna().unique().tolist()), index=0, key="afr_plaats")
-    start,end = rng if isinstance(rng, tuple) else (df["Datum"].min(), df["Datum"].max())
-    m = (df["Datum"]>=start)&(df["Datum"]<=end)
-    if pf!="Alle": m &= df["Plaats"]==pf
-    s = df.loc[m].copy()
-    if s.empty: st.warning("Geen duiken in de gekozen periode/filters."); return
-    per = s.groupby("Duiker").size().reset_index(name="AantalDuiken")
+        plaatsen = ["Alle"] + agg.place_names
+        pf = st.selectbox("Duikplaats (optioneel)", plaatsen, index=0, key=keep("afr_plaats", plaatsen))
+    start,end = rng if isinstance(rng, tuple) else (min_d, max_d)
+    per = agg.period(start, end, plaats=None if pf=="Alle" else pf)
+    if per.empty: st.warning("Geen duiken in de gekozen periode/filters."); return
     per["Bedrag"] = (per["AantalDuiken"]*bedrag).round(2)
     st.dataframe(per, use_container_width=True, hide_index=True, key="afr_table")
     total = per["Bedrag"].sum()
     st.metric("Totaal uit te keren", f"€ {total:,.2f}".replace(",", "X").replace(".", ",").replace("X","."))
-    out = io.BytesIO()
-    with pd.ExcelWriter(out, engine="openpyxl") as w:
-        per.to_excel(w, index=False, sheet_name="Afrekening")
-        s.sort_values(["Datum","Plaats","Duiker"]).to_excel(w, index=False, sheet_name="Detail")
-    st.download_button("⬇️ Download Afrekening (Excel)", data=out.getvalue(), file_name="Afrekening.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", key="afr_xlsx")
+    version = dataset_version(DUIKEN_FILE)
+    export_buttons("afr", (version, start, end, pf, bedrag), [
+        ("⬇️ Download Afrekening (Excel)", lambda: export_afrekening(version, start, end, pf, bedrag), "Afrekening.xlsx", exports.XLSX_MIME, "afr_xlsx"),
+    ])
 
 def page_beheer():
     appbar("beheer")
     if st.session_state.get("role","user") != "admin":
         st.error("Toegang geweigerd — alleen admins."); return
-    tabs = st.tabs(["Gebruikers","Duikers","Duikplaatsen","Backup"])
-    with tabs[0]:
+    tab = st.radio("Beheer", ["Gebruikers","Duikers","Duikplaatsen","Import","Backup","Audit","Cache","Prestaties"], horizontal=True, key=keep("beheer_tab"), label_visibility="collapsed")
+    if tab == "Gebruikers":
         users = load_users().copy()
+        state = throttle().frame().set_index("Username")
+        users["FailedAttempts"] = users["Username"].map(state["FailedAttempts"]).fillna(0).astype(int)
+        users["LockedUntil"] = users["Username"].map(state["LockedUntil"]).fillna("")
         st.dataframe(users[["Username","Role","FailedAttempts","LockedUntil"]], use_container_width=True, hide_index=True, key="users_table")
         st.subheader("Nieuwe gebruiker")
         c1,c2,c3 = st.columns(3)
@@ -336,68 +569,186 @@ def page_beheer():
         with c3: r = st.selectbox("Rol", ["user","admin"], index=0, key="beheer_u_role")
         if st.button("Gebruiker toevoegen", key="beheer_btn_user_add"):
             if u and p and (u not in users["Username"].astype(str).tolist()):
-                hashed = bcrypt.hashpw(p.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
-                new_row = pd.DataFrame([{"Username":u,"Password":"","PasswordHash":hashed,"Role":r,"FailedAttempts":0,"LockedUntil":""}])
-                users = pd.concat([users, new_row], ignore_index=True)
-                persist_users(users); refresh_all(); st.success(f"Gebruiker '{u}' toegevoegd."); st.rerun()
+                hashed = auth.hash_password(p)
+                add_user(u, hashed, r); audit_event("gebruiker_toegevoegd", f"{u} ({r})")
+                st.success(f"Gebruiker '{u}' toegevoegd."); st.rerun()
             else: st.warning("Ongeldig of reeds bestaand.")
         st.divider()
         st.subheader("Wachtwoord resetten / Deblokkeren")
         all_users = users["Username"].astype(str).tolist()
-        sel_user = st.selectbox("Kies gebruiker", all_users, key="beheer_sel_user")
+        sel_user = st.selectbox("Kies gebruiker", all_users, key=keep("beheer_sel_user", all_users))
         new_pw = st.text_input("Nieuw wachtwoord", key="beheer_new_pw")
         colr1, colr2 = st.columns(2)
         with colr1:
             if st.button("Reset wachtwoord", key="beheer_btn_reset_pw"):
                 if sel_user and new_pw:
-                    set_password(users, sel_user, new_pw); st.success(f"Wachtwoord van '{sel_user}' is gewijzigd.")
+                    set_password(sel_user, new_pw); audit_event("wachtwoord_gewijzigd", sel_user)
+                    st.success(f"Wachtwoord van '{sel_user}' is gewijzigd.")
                 else: st.warning("Selecteer gebruiker en geef nieuw wachtwoord in.")
         with colr2:
             if st.button("Deblokkeer account", key="beheer_btn_unlock"):
-                clear_lock(users, sel_user); st.success(f"Account van '{sel_user}' is gedeblokkeerd.")
-    with tabs[1]:
+                clear_lock(sel_user); audit_event("gedeblokkeerd", sel_user)
+                st.success(f"Account van '{sel_user}' is gedeblokkeerd.")
+    elif tab == "Duikers":
         duikers = load_duikers().copy()
         st.dataframe(duikers, use_container_width=True, hide_index=True, key="duikers_table")
         nd = st.text_input("Nieuwe duiker naam", key="beheer_nieuwe_duiker")
         if st.button("Toevoegen aan duikers", key="beheer_btn_duiker_toevoegen"):
             if nd and (nd not in duikers["Naam"].astype(str).tolist()):
-                duikers.loc[len(duikers)] = [nd]; save_file(DUIKERS_FILE, duikers); refresh_all(); st.success(f"Duiker '{nd}' toegevoegd."); st.rerun()
+                append_rows(DUIKERS_FILE, pd.DataFrame({"Naam":[nd]})); audit_event("duiker_toegevoegd", nd)
+                st.success(f"Duiker '{nd}' toegevoegd."); st.rerun()
             else: st.warning("Leeg of al bestaand.")
-    with tabs[2]:
+    elif tab == "Duikplaatsen":
         places = load_places().copy()
         st.dataframe(places, use_container_width=True, hide_index=True, key="places_table")
         np = st.text_input("Nieuwe duikplaats", key="beheer_nieuwe_plaats")
         if st.button("Toevoegen aan duikplaatsen", key="beheer_btn_plaats_toevoegen"):
             if np and (np not in places["Plaats"].astype(str).tolist()):
-                places.loc[len(places)] = [np]; save_file(PLACES_FILE, places); refresh_all(); st.success(f"Duikplaats '{np}' toegevoegd."); st.rerun()
+                append_rows(PLACES_FILE, pd.DataFrame({"Plaats":[np]})); audit_event("duikplaats_toegevoegd", np)
+                st.success(f"Duikplaats '{np}' toegevoegd."); st.rerun()
             else: st.warning("Leeg of al bestaand.")
-    with tabs[3]:
-        st.subheader("Backup (zip)")
-        import zipfile, os
-        buf = io.BytesIO()
-        with zipfile.ZipFile(buf, "w") as z:
-            for f in [USERS_FILE, DUIKERS_FILE, PLACES_FILE, DUIKEN_FILE]:
-                if Path(f).exists(): z.write(f, os.path.basename(f))
-        st.download_button("⬇️ Download duikapp_backup.zip", data=buf.getvalue(),
-                           file_name="duikapp_backup.zip", mime="application/zip", key="beheer_backup_dl")
+    elif tab == "Import":
+        st.subheader("Bulkimport van duiken")
+        st.markdown("<span class='hint'>CSV of Excel met de kolommen Datum, Plaats en Duiker (één rij per duiker per duik). "
+                    "Datums als dd/mm/jjjj, jjjj-mm-dd of Excel-datum.</span>", unsafe_allow_html=True)
+        n = st.session_state.setdefault("import_round", 0)
+        up = st.file_uploader("Bestand", type=["csv","xlsx"], key=f"beheer_import_file_{n}")
+        if up is None: return
+        duikers, plaatsen = load_duikers(), load_places()
+        try: plan = import_plan(up.name, up.getvalue(), dataset_version(DUIKERS_FILE), dataset_version(PLACES_FILE))
+        except ValueError as e: st.error(f"Kan bestand niet lezen: {e}"); return
+        c1,c2,c3 = st.columns(3)
+        c1.metric("Rijen", plan.total); c2.metric("Geldig", len(plan.rows)); c3.metric("Ongeldig", len(plan.invalid))
+        if len(plan.invalid):
+            with st.expander(f"Ongeldige rijen ({len(plan.invalid)}) — worden overgeslagen"):
+                st.dataframe(plan.invalid.head(1000), use_container_width=True, hide_index=True, key="import_invalid")
+        choices = []
+        if plan.unknown:
+            st.subheader("Onbekende namen")
+            st.markdown("<span class='hint'>Vink 'Suggestie gebruiken' aan om de naam te vervangen door de suggestie (aanpasbaar); "
+                        "anders wordt de naam nieuw aangemaakt.</span>", unsafe_allow_html=True)
+            edited = st.data_editor(pd.DataFrame(plan.unknown), use_container_width=True, hide_index=True,
+                                    disabled=["Soort","Naam","Alternatieven"], key=f"import_names_{n}")
+            choices = edited.to_dict("records")
+        rows, new_divers, new_places, dup = plan.resolve(choices, duiken_keys(dataset_version(DUIKEN_FILE)),
+                                                         _names(duikers, "Naam"), _names(plaatsen, "Plaats"))
+        st.info(f"{len(rows)} nieuwe duik(en); {dup['bestaand']} al aanwezig en {dup['in_bestand']} dubbel in het bestand worden overgeslagen.")
+        ok = True
+        if new_divers or new_places:
+            ok = st.checkbox(f"Maak {len(new_divers)} nieuwe duiker(s) en {len(new_places)} nieuwe duikplaats(en) aan", key=f"import_create_ok_{n}")
+            with st.expander("Nieuwe namen"):
+                st.write({"Duikers": new_divers, "Duikplaatsen": new_places})
+        if st.button(f"Importeer {len(rows)} duik(en)", type="primary", disabled=(len(rows)==0 or not ok), key="beheer_btn_import"):
+            import_duiken(rows, new_divers, new_places)
+            audit_event("import", f"{up.name}: {len(rows)} duik(en), {len(new_divers)} nieuwe duiker(s), {len(new_places)} nieuwe duikplaats(en)")
+            st.session_state["import_round"] = n + 1
+            st.success(f"{len(rows)} duik(en) geïmporteerd.")
+    elif tab == "Backup":
+        st.subheader("Backups")
+        sched = backup_scheduler()
+        if backup.BACKUP_INTERVAL_HOURS > 0:
+            st.markdown(f"<span class='hint'>Automatische backup elke {backup.BACKUP_INTERVAL_HOURS:g} u naar '{backup.BACKUP_DIR}', "
+                        f"de laatste {backup.BACKUP_KEEP} worden bewaard.</span>", unsafe_allow_html=True)
+        if sched.last_error: st.warning(f"Laatste automatische backup mislukt: {sched.last_error}")
+        if st.button("Nu een backup maken", key="beheer_btn_backup_now"):
+            with perf.span("backup:snapshot"): sid = backup.snapshot(DATA_FILES)
+            audit_event("backup", sid)
+            st.success(f"Backup {sid} gemaakt.")
+        snaps = backup.snapshots()
+        if not snaps: st.info("Nog geen backups."); return
+        st.dataframe(pd.DataFrame([{"Backup": s["id"], "Tijd (UTC)": s["created"], "Soort": s["kind"],
+                                    **{n: e["rows"] for n, e in s["files"].items()}} for s in snaps]),
+                     use_container_width=True, hide_index=True, key="beheer_backup_table")
+        ids = [s["id"] for s in snaps]
+        sid = st.selectbox("Kies backup", ids, key=keep("beheer_backup_sel", ids))
+        export_buttons("backup", sid, [("⬇️ Download backup (zip)", lambda: backup_zip(sid),
+                                        f"duikapp_backup_{sid}.zip", "application/zip", "beheer_backup_dl")])
+        st.divider()
+        st.subheader("Herstellen")
+        st.markdown("<span class='hint'>Vervangt alle gegevens door die van de gekozen backup. "
+                    "De huidige toestand wordt eerst zelf als backup bewaard.</span>", unsafe_allow_html=True)
+        ok = st.checkbox(f"Ja, herstel backup {sid}", key="beheer_restore_ok")
+        if st.button("Herstel", disabled=not ok, key="beheer_btn_restore"):
+            with perf.span("backup:herstel"): n = backup.restore(sid, DATA_FILES)
+            audit_event("backup_hersteld", sid)
+            st.success(f"{n} bestand(en) hersteld uit {sid}.")
+    elif tab == "Audit":
+        st.subheader("Audittrail")
+        log = audit.get_log()
+        today = dt.utcnow().date()
+        c1, c2, c3 = st.columns([2,3,3])
+        with c1:
+            key = keep("beheer_audit_periode")
+            if key not in st.session_state: st.session_state[key] = (today - timedelta(days=7), today)
+            periode = st.date_input("Periode (UTC)", format="DD/MM/YYYY", key=key)
+        if not isinstance(periode, (tuple, list)) or len(periode) != 2: st.info("Kies een begin- en einddatum."); return
+        start, end = dt.combine(periode[0], dt.min.time()), dt.combine(periode[1] + timedelta(days=1), dt.min.time())
+        with perf.span("audit:lezen") as s:
+            window = log.read(start, end)
+            s.note(rows=len(window))
+        users, actions = sorted(window["User"].unique()), sorted(window["Action"].unique())
+        with c2: fu = st.multiselect("Gebruiker", users, key=keep("beheer_audit_users", users))
+        with c3: fa = st.multiselect("Actie", actions, key=keep("beheer_audit_actions", actions))
+        text = st.text_input("Zoek in details", key=keep("beheer_audit_text"))
+        view = audit.select(window, fu, fa, text)
+        st.dataframe(view.head(1000), use_container_width=True, hide_index=True, key="beheer_audit_table")
+        st.markdown(f"<span class='hint'>{len(view)} gebeurtenis(sen), de nieuwste eerst (max. 1000 getoond). "
+                    f"Bestanden in '{audit.AUDIT_DIR}', één per dag.</span>", unsafe_allow_html=True)
+        if log.last_error: st.warning(f"Laatste wegschrijven mislukt: {log.last_error}")
+        export_buttons("audit", (start, end, tuple(fu), tuple(fa), text), [
+            ("⬇️ Download Excel", lambda: audit.export_xlsx(view), f"audit_{periode[0]:%Y%m%d}_{periode[1]:%Y%m%d}.xlsx",
+             "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "beheer_audit_xlsx")])
+    elif tab == "Cache":
+        st.subheader("Cache per loader")
+        stats = cache_stats()
+        with stats["lock"]: calls, misses = dict(stats["calls"]), dict(stats["misses"])
+        rows = []
+        for name, f in LOADERS:
+            c, m = calls.get(name, 0), misses.get(name, 0)
+            rows.append({"Loader":name, "Aanroepen":c, "Hits":max(c-m, 0), "Misses":m,
+                         "Hitratio":f"{(c-m)/c:.0%}" if c else "—", "Versie":str(dataset_version(f))})
+        st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True, key="cache_table")
+        st.markdown(f"<span class='hint'>Opslag: {storage.get_backend().name}. Tellers gelden voor dit serverproces, over alle sessies heen.</span>", unsafe_allow_html=True)
+        if st.button("Tellers resetten", key="beheer_btn_cache_reset"):
+            with stats["lock"]: stats["calls"].clear(); stats["misses"].clear()
+            st.rerun()
+        st.subheader("Afrekening-aggregaat")
+        if st.button("Controleer tegen volledige herberekening", key="beheer_btn_agg_check"):
+            agg = load_settlement()
+            problems = agg.check(_load_duiken(agg.version))
+            if problems: st.error(f"{len(problems)} afwijking(en):\n\n" + "\n".join(f"- {p}" for p in problems[:50]))
+            else: st.success("Aggregaat komt overeen met de duikentabel.")
+    elif tab == "Prestaties":
+        st.subheader("Prestaties per span")
+        on = st.toggle("Metingen aan", value=perf.enabled, key="beheer_perf_on")
+        if on != perf.enabled: perf.set_enabled(on)
+        st.dataframe(perf.stats(), use_container_width=True, hide_index=True, key="perf_table")
+        st.markdown(f"<span class='hint'>Percentielen over de laatste {perf.PERF_WINDOW} metingen per span, voor dit serverproces "
+                    "over alle sessies heen. Cachefuncties tellen enkel hun eigen werk bij een miss.</span>", unsafe_allow_html=True)
+        if st.button("Metingen resetten", key="beheer_btn_perf_reset"): perf.reset(); st.rerun()
+        st.subheader("Export (JSON-lines)")
+        if perf.log_path: st.markdown(f"Elke span wordt weggeschreven naar `{perf.log_path}`.")
+        path = st.text_input("Bestand", value=perf.log_path or "duikapp_perf.jsonl", key="beheer_perf_log")
+        c1, c2 = st.columns(2)
+        with c1:
+            if st.button("Export starten", key="beheer_btn_perf_log_on"): perf.set_log(path); st.rerun()
+        with c2:
+            if st.button("Export stoppen", disabled=not perf.log_path, key="beheer_btn_perf_log_off"): perf.set_log(None); st.rerun()
 
 def main():
     if "session_id" not in st.session_state:
         st.session_state.session_id = str(uuid.uuid4())
     if "logged_in" not in st.session_state: st.session_state.logged_in = False
-    if not st.session_state.logged_in: login_page(); return
+    if not st.session_state.logged_in:
+        with perf.span("pagina:Login"): login_page()
+        return
+    backup_scheduler()
     role = st.session_state.get("role","user")
-    if role == "admin":
-        tabs = st.tabs(["Duiken invoeren","Overzicht","Afrekening","Beheer"])
-        with tabs[0]: page_duiken()
-        with tabs[1]: page_overzicht()
-        with tabs[2]: page_afrekening()
-        with tabs[3]: page_beheer()
-    else:
-        tabs = st.tabs(["Duiken invoeren","Overzicht","Afrekening"])
-        with tabs[0]: page_duiken()
-        with tabs[1]: page_overzicht()
-        with tabs[2]: page_afrekening()
+    # Navigatie i.p.v. st.tabs: enkel de gekozen pagina wordt uitgevoerd bij een rerun
+    pages = {"Duiken invoeren": page_duiken, "Overzicht": page_overzicht, "Afrekening": page_afrekening}
+    if role == "admin": pages["Beheer"] = page_beheer
+    keuze = st.radio("Pagina", list(pages), horizontal=True, key=keep("nav_page", list(pages)), label_visibility="collapsed")
+    with perf.span(f"pagina:{keuze}"): pages[keuze]()
 
 if __name__ == "__main__":
     main()
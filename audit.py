@@ -0,0 +1,159 @@
+import os
+import re
+import json
+import atexit
+import logging
+import datetime
+import threading
+from pathlib import Path
+import pandas as pd
+import exports
+
+AUDIT_DIR = os.environ.get("DUIKAPP_AUDIT_DIR", "audit")
+AUDIT_FLUSH_SECONDS = float(os.environ.get("DUIKAPP_AUDIT_FLUSH_SECONDS", "1"))
+AUDIT_BUFFER = int(os.environ.get("DUIKAPP_AUDIT_BUFFER", "500"))
+AUDIT_ROTATE_MB = float(os.environ.get("DUIKAPP_AUDIT_ROTATE_MB", "10"))
+AUDIT_KEEP_DAYS = int(os.environ.get("DUIKAPP_AUDIT_KEEP_DAYS", "0"))  # 0 = alles bewaren
+LEGACY_FILE = "audit_log.xlsx"
+COLUMNS = ["TimestampUTC", "User", "Action", "Details", "SessionId"]
+
+log = logging.getLogger(__name__)
+
+# Audittrail: log() zet een gebeurtenis enkel in een buffer; een achtergrondthread schrijft de
+# buffer elke AUDIT_FLUSH_SECONDS (of zodra er AUDIT_BUFFER klaarstaan) in één append weg.
+# Opbouw van de auditmap: één JSON-lines bestand per UTC-dag, audit-<jjjjmmdd>.jsonl, met een
+# volgnummer erbij (audit-<jjjjmmdd>.1.jsonl, ...) zodra een bestand AUDIT_ROTATE_MB overschrijdt.
+# Een venster lezen opent zo enkel de bestanden van de gevraagde dagen.
+_NAME = re.compile(r"^audit-(\d{8})(?:\.(\d+))?\.jsonl$")
+
+def _name(day, n):
+    return f"audit-{day:%Y%m%d}{f'.{n}' if n else ''}.jsonl"
+
+def _line(event):
+    return (json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8")
+
+class AuditLog:
+    def __init__(self, root=AUDIT_DIR, flush_seconds=AUDIT_FLUSH_SECONDS, buffer=AUDIT_BUFFER,
+                 rotate_mb=AUDIT_ROTATE_MB, keep_days=AUDIT_KEEP_DAYS, legacy=LEGACY_FILE):
+        self.root = Path(root)
+        self.flush_seconds, self.buffer, self.keep_days = flush_seconds, buffer, keep_days
+        self.rotate_bytes = int(rotate_mb * (1 << 20))
+        self.last_error = None
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pruned = None
+        self.root.mkdir(parents=True, exist_ok=True)
+        if legacy and not self.files(): self._migrate(legacy)
+        threading.Thread(target=self._run, daemon=True, name="duikapp-audit").start()
+        atexit.register(self.flush)
+
+    def log(self, action, user="", details="", session=""):
+        event = {"TimestampUTC": datetime.datetime.utcnow().isoformat(timespec="milliseconds"), "User": str(user or ""),
+                 "Action": action, "Details": str(details or ""), "SessionId": str(session or "")}
+        with self._lock:
+            self._pending.append(event)
+            full = len(self._pending) >= self.buffer
+        if full: self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_seconds); self._wake.clear()
+            try:
+                self.flush(); self.last_error = None
+                today = datetime.datetime.utcnow().date()
+                if self.keep_days > 0 and self._pruned != today: self.prune(); self._pruned = today
+            except Exception as e:
+                log.exception("auditlog wegschrijven mislukt"); self.last_error = str(e)
+
+    def files(self):
+        # [(dag, volgnummer, pad)] in chronologische volgorde
+        out = []
+        for p in self.root.iterdir():
+            m = _NAME.match(p.name)
+            if m: out.append((datetime.datetime.strptime(m.group(1), "%Y%m%d").date(), int(m.group(2) or 0), p))
+        return sorted(out)
+
+    def _segment(self, day, size):
+        segs = [(n, p) for d, n, p in self.files() if d == day]
+        n, path = segs[-1] if segs else (0, self.root / _name(day, 0))
+        if path.exists() and 0 < path.stat().st_size and path.stat().st_size + size > self.rotate_bytes:
+            n += 1; path = self.root / _name(day, n)
+        return path
+
+    def _append(self, day, data):
+        # één write met O_APPEND: regels van andere processen lopen niet door elkaar
+        fd = os.open(self._segment(day, len(data)), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try: os.write(fd, data)
+        finally: os.close(fd)
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock: events, self._pending = self._pending, []
+            days = {}
+            for e in events: days.setdefault(e["TimestampUTC"][:10], []).append(e)
+            groups = list(days.items())
+            for i, (day, group) in enumerate(groups):
+                try: self._append(datetime.date.fromisoformat(day), b"".join(_line(e) for e in group))
+                except OSError:
+                    # niet weggeschreven gebeurtenissen terug vooraan in de buffer voor de volgende poging
+                    with self._lock: self._pending[:0] = [e for _, g in groups[i:] for e in g]
+                    raise
+            return len(events)
+
+    def prune(self):
+        limit = datetime.datetime.utcnow().date() - datetime.timedelta(days=self.keep_days)
+        for day, _, p in self.files():
+            if day < limit: p.unlink(missing_ok=True)
+
+    def _migrate(self, legacy):
+        # eenmalig: rijen uit het oude audit_log.xlsx overnemen in de dagbestanden
+        if not Path(legacy).exists(): return
+        try: df = pd.read_excel(legacy, engine="openpyxl", dtype=object)
+        except Exception: log.warning("kan %s niet lezen", legacy, exc_info=True); return
+        if df.empty: return
+        ts = pd.to_datetime(df["TimestampUTC"], errors="coerce", format="mixed") if "TimestampUTC" in df else []
+        with self._lock:
+            for t, row in zip(ts, df.reindex(columns=COLUMNS).itertuples(index=False)):
+                if pd.isna(t): continue
+                self._pending.append({"TimestampUTC": t.isoformat(timespec="milliseconds"),
+                                      **{c: "" if pd.isna(v) else str(v) for c, v in zip(COLUMNS[1:], row[1:])}})
+            self._pending.sort(key=lambda e: e["TimestampUTC"])
+        self.flush()
+
+    def read(self, start, end):
+        # [start, end) in UTC; enkel de dagbestanden binnen het venster worden geopend
+        self.flush()
+        lo, hi = start.isoformat(timespec="milliseconds"), end.isoformat(timespec="milliseconds")
+        rows = []
+        for day, _, p in self.files():
+            if not (start.date() <= day <= end.date()): continue
+            with open(p, "rb") as fh:
+                for line in fh:
+                    # een laatste regel zonder newline is nog in aanmaak door een ander proces
+                    if not line.endswith(b"\n"): continue
+                    e = json.loads(line)
+                    if lo <= e["TimestampUTC"] < hi: rows.append(e)
+        # nieuwste eerst; binnen dezelfde milliseconde de bestandsvolgorde omgekeerd behouden
+        df = pd.DataFrame(rows[::-1], columns=COLUMNS)
+        return df.sort_values("TimestampUTC", ascending=False, kind="stable").reset_index(drop=True)
+
+def select(frame, users=None, actions=None, text=""):
+    if users: frame = frame[frame["User"].isin(users)]
+    if actions: frame = frame[frame["Action"].isin(actions)]
+    if text: frame = frame[frame["Details"].str.contains(text, case=False, regex=False)]
+    return frame
+
+def export_xlsx(frame):
+    # zelfde kolommen en blad als het oude audit_log.xlsx
+    return exports.frame_xlsx(frame[COLUMNS], "Sheet1")
+
+_audit = None
+_audit_lock = threading.Lock()
+
+def get_log():
+    global _audit
+    with _audit_lock:
+        if _audit is None: _audit = AuditLog()
+        return _audit
@@ -0,0 +1,84 @@
+import os
+import re
+import sqlite3
+import datetime
+import threading
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+import bcrypt
+import pandas as pd
+
+BCRYPT_ROUNDS = int(os.environ.get("DUIKAPP_BCRYPT_ROUNDS", "12"))
+HASH_WORKERS = int(os.environ.get("DUIKAPP_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+THROTTLE_DB = os.environ.get("DUIKAPP_THROTTLE_DB", "duikapp_throttle.db")
+
+# bcrypt geeft de GIL vrij: een begrensde threadpool laat meerdere logins tegelijk hashen
+# zonder dat een piek meer dan HASH_WORKERS kernen opeist.
+_pool = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="duikapp-bcrypt")
+_COST = re.compile(r"^\$2[abxy]?\$(\d\d)\$")
+
+def hash_password(password, rounds=None):
+    salt = bcrypt.gensalt(rounds or BCRYPT_ROUNDS)
+    return _pool.submit(bcrypt.hashpw, password.encode("utf-8"), salt).result().decode("utf-8")
+
+def check_password(password, hashed):
+    try: return _pool.submit(bcrypt.checkpw, password.encode("utf-8"), hashed.encode("utf-8")).result()
+    except Exception: return False
+
+def needs_rehash(hashed, rounds=None):
+    m = _COST.match(hashed or "")
+    return m is None or int(m.group(1)) != (rounds or BCRYPT_ROUNDS)
+
+# Mislukte pogingen en blokkeringen staan los van het gebruikersbestand in een kleine
+# SQLite-tabel: één rij per gebruiker met foute pogingen, atomair bijgewerkt, ook over
+# processen heen. Gebruikers zonder rij hebben geen foute pogingen en zijn niet geblokkeerd.
+class ThrottleStore:
+    def __init__(self, path=THROTTLE_DB, seed=None):
+        self.path = path
+        self._lock = threading.Lock()
+        with closing(self._connect()) as con, con:
+            fresh = con.execute("SELECT 1 FROM sqlite_master WHERE name = 'throttle'").fetchone() is None
+            con.execute("CREATE TABLE IF NOT EXISTS throttle (username TEXT PRIMARY KEY, failed INTEGER NOT NULL, locked_until TEXT NOT NULL)")
+            # eenmalig de tellers uit het oude gebruikersbestand overnemen
+            if fresh and seed is not None:
+                rows = [(str(u), int(f or 0), str(l or "")) for u, f, l in seed() if int(f or 0) or str(l or "")]
+                con.executemany("INSERT OR REPLACE INTO throttle VALUES (?, ?, ?)", rows)
+
+    def _connect(self):
+        con = sqlite3.connect(self.path, timeout=30)
+        con.execute("PRAGMA journal_mode=WAL")
+        return con
+
+    def state(self, username):
+        with closing(self._connect()) as con:
+            row = con.execute("SELECT failed, locked_until FROM throttle WHERE username = ?", (username,)).fetchone()
+        return (row[0], row[1]) if row else (0, "")
+
+    def fail(self, username, max_attempts, lock_minutes):
+        with self._lock, closing(self._connect()) as con, con:
+            con.execute("BEGIN IMMEDIATE")
+            row = con.execute("SELECT failed FROM throttle WHERE username = ?", (username,)).fetchone()
+            attempts = (row[0] if row else 0) + 1
+            locked_until = ""
+            if attempts >= max_attempts:
+                until = datetime.datetime.utcnow() + datetime.timedelta(minutes=lock_minutes)
+                locked_until = until.isoformat(timespec="seconds")
+            con.execute("INSERT OR REPLACE INTO throttle VALUES (?, ?, ?)", (username, 0 if locked_until else attempts, locked_until))
+        return attempts, locked_until
+
+    def clear(self, username):
+        with self._lock, closing(self._connect()) as con, con:
+            con.execute("DELETE FROM throttle WHERE username = ?", (username,))
+
+    def frame(self):
+        with closing(self._connect()) as con:
+            return pd.read_sql_query("SELECT username AS Username, failed AS FailedAttempts, locked_until AS LockedUntil FROM throttle", con)
+
+_throttle = None
+_throttle_lock = threading.Lock()
+
+def get_throttle(seed=None):
+    global _throttle
+    with _throttle_lock:
+        if _throttle is None: _throttle = ThrottleStore(THROTTLE_DB, seed=seed)
+        return _throttle
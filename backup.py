@@ -0,0 +1,148 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import zipfile
+import datetime
+import threading
+from pathlib import Path
+import pandas as pd
+import storage
+import exports
+
+BACKUP_DIR = os.environ.get("DUIKAPP_BACKUP_DIR", "backups")
+BACKUP_INTERVAL_HOURS = float(os.environ.get("DUIKAPP_BACKUP_INTERVAL_HOURS", "24"))  # 0 = geen automatische backups
+BACKUP_KEEP = int(os.environ.get("DUIKAPP_BACKUP_KEEP", "14"))
+CHUNK = 1 << 20
+
+log = logging.getLogger(__name__)
+
+# Opbouw van de backupmap:
+#   objects/<sha256>.xlsx   één werkboek per unieke inhoud (hash over de data, niet over de xlsx-bytes)
+#   snapshots/<tijd>.json   manifest: per dataset de hash, de dataversie en het aantal rijen
+# Een ongewijzigde dataset wordt dus nooit opnieuw weggeschreven; bij een ongewijzigde
+# dataversie wordt hij zelfs niet gelezen.
+
+def _dirs(root):
+    root = Path(root)
+    (root / "objects").mkdir(parents=True, exist_ok=True)
+    (root / "snapshots").mkdir(parents=True, exist_ok=True)
+    return root / "objects", root / "snapshots"
+
+def _content_hash(df):
+    h = hashlib.sha256(json.dumps([str(c) for c in df.columns]).encode("utf-8"))
+    if len(df): h.update(pd.util.hash_pandas_object(df.astype(object), index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+def _jsonable(version):
+    return json.loads(json.dumps(version))
+
+def snapshots(root=BACKUP_DIR):
+    _, snaps = _dirs(root)
+    out = []
+    for p in sorted(snaps.glob("*.json"), reverse=True):
+        try: out.append({"id": p.stem, **json.loads(p.read_text("utf-8"))})
+        except ValueError: log.warning("onleesbaar manifest %s", p)
+    return out
+
+def snapshot(files, kind="manueel", root=BACKUP_DIR, keep=BACKUP_KEEP):
+    objects, snaps = _dirs(root)
+    backend = storage.get_backend()
+    last = {name: entry for s in snapshots(root)[:1] for name, entry in s["files"].items()}
+    entries, frames = {}, {}
+    # onder het bestandsslot enkel een consistente kopie in het geheugen nemen; hashen en de
+    # werkboeken schrijven gebeurt daarna, zonder schrijfacties en lezers tegen te houden
+    with storage.FileLock():
+        for f in files:
+            name = os.path.basename(f)
+            version = _jsonable(backend.version(f))
+            # nog nooit aangemaakt (geen versie, geen werkboek): niets te bewaren
+            if not any(version if isinstance(version, list) else [version]) and not Path(f).exists(): continue
+            if name in last and last[name]["version"] == version and (objects / f"{last[name]['hash']}.xlsx").exists():
+                entries[name] = last[name]; continue
+            entries[name] = None; frames[name] = (version, backend.read(f, []))
+    for name, (version, df) in frames.items():
+        digest = _content_hash(df)
+        obj = objects / f"{digest}.xlsx"
+        if not obj.exists():
+            # eigen tijdelijk bestand: een manuele en een automatische snapshot kunnen nu tegelijk schrijven
+            tmp = obj.with_suffix(f".{os.getpid()}-{threading.get_ident()}.tmp")
+            tmp.write_bytes(exports.frame_xlsx(df, "Sheet1"))
+            os.replace(tmp, obj)
+        entries[name] = {"hash": digest, "version": version, "rows": len(df)}
+    now = datetime.datetime.utcnow()
+    sid = now.strftime("%Y%m%dT%H%M%S%fZ")
+    tmp = snaps / f"{sid}.tmp"
+    tmp.write_text(json.dumps({"created": now.isoformat(timespec="seconds"), "kind": kind, "files": entries}), "utf-8")
+    os.replace(tmp, snaps / f"{sid}.json")
+    prune(root, keep)
+    return sid
+
+def prune(root=BACKUP_DIR, keep=BACKUP_KEEP):
+    objects, snaps = _dirs(root)
+    for p in sorted(snaps.glob("*.json"), reverse=True)[keep:]:
+        p.unlink()
+        (Path(root) / "zips" / f"{p.stem}.zip").unlink(missing_ok=True)
+    used = {e["hash"] for s in snapshots(root) for e in s["files"].values()}
+    for p in objects.glob("*.xlsx"):
+        if p.stem not in used: p.unlink()
+
+def _manifest(sid, root):
+    _, snaps = _dirs(root)
+    return json.loads((snaps / f"{sid}.json").read_text("utf-8"))
+
+def write_zip(sid, out, root=BACKUP_DIR):
+    # de werkboeken in blokken van CHUNK bytes van schijf naar de zip kopiëren: nooit alles tegelijk in het geheugen
+    objects, _ = _dirs(root)
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as z:
+        for name, entry in _manifest(sid, root)["files"].items():
+            with open(objects / f"{entry['hash']}.xlsx", "rb") as src, z.open(name, "w") as dst:
+                shutil.copyfileobj(src, dst, CHUNK)
+
+def zip_path(sid, root=BACKUP_DIR):
+    # snapshots zijn onveranderlijk: de zip wordt één keer op schijf gebouwd en daarna hergebruikt
+    zips = Path(root) / "zips"; zips.mkdir(parents=True, exist_ok=True)
+    path = zips / f"{sid}.zip"
+    if not path.exists():
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "wb") as out: write_zip(sid, out, root)
+        os.replace(tmp, path)
+    return path
+
+def restore(sid, files, root=BACKUP_DIR):
+    # eerst een vangnet-snapshot van de huidige toestand, daarna elk bestand via de schrijver vervangen
+    objects, _ = _dirs(root)
+    manifest = _manifest(sid, root)
+    snapshot(files, kind="voor herstel", root=root, keep=max(BACKUP_KEEP, len(snapshots(root)) + 1))
+    writer = storage.get_writer()
+    futures = []
+    for f in files:
+        entry = manifest["files"].get(os.path.basename(f))
+        if entry is None: continue
+        df = pd.read_excel(objects / f"{entry['hash']}.xlsx", engine="openpyxl")
+        futures.append(writer.write(f, df))
+    for fut in futures: fut.result()
+    return len(futures)
+
+class Scheduler:
+    def __init__(self, files, interval_hours=BACKUP_INTERVAL_HOURS, root=BACKUP_DIR):
+        self.files, self.interval, self.root = list(files), interval_hours * 3600, root
+        self.last_error = None
+        if self.interval > 0:
+            threading.Thread(target=self._run, daemon=True, name="duikapp-backup").start()
+
+    def due_in(self):
+        auto = [s for s in snapshots(self.root) if s.get("kind") == "auto"]
+        if not auto: return 0
+        last = datetime.datetime.fromisoformat(auto[0]["created"])
+        return max(0, self.interval - (datetime.datetime.utcnow() - last).total_seconds())
+
+    def _run(self):
+        while True:
+            wait = self.due_in()
+            if wait > 0: time.sleep(min(wait, 600)); continue
+            try: snapshot(self.files, kind="auto", root=self.root); self.last_error = None
+            except Exception as e:
+                log.exception("automatische backup mislukt"); self.last_error = str(e); time.sleep(600)
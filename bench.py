@@ -0,0 +1,281 @@
+# Benchmark van de duikapp op synthetische clubdata.
+#
+#   python bench.py                          # 1k, 100k en 1M duiken, excel-opslag, resultaat in bench.json
+#   python bench.py --sizes 1000 100000 --backend sqlite --out sqlite.json
+#   python bench.py --baseline bench.json    # vergelijken met een vorige run; exit 1 bij regressie
+#
+# Per grootte draait een apart proces (eigen caches en geheugen). Elke stap wordt --repeat keer
+# getimed zonder tracing en daarna nog één keer met tracemalloc voor de geheugenpiek.
+# De cold_*-stappen starten telkens een nieuw proces: tijd tot de eerste getekende pagina.
+import os
+import sys
+import json
+import time
+import io
+import shutil
+import zipfile
+import argparse
+import platform
+import datetime
+import tempfile
+import subprocess
+import statistics
+import tracemalloc
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+SIZES = [1_000, 100_000, 1_000_000]
+
+# ---------- synthetische data ----------
+
+FIRST = ["Jan","Piet","An","Els","Tom","Sofie","Bart","Lien","Wim","Karen","Dirk","Nele","Koen","Inge","Joris","Eva","Stijn","Leen","Pieter","Ann"]
+LAST = ["Peeters","Janssens","Maes","Jacobs","Mertens","Willems","Claes","Goossens","Wouters","De Smet","Dubois","Hermans","Aerts","Smets","Vermeulen"]
+PLACES = ["Vobra","Put van Ekeren","Zilvermeer","Oosterschelde","Grevelingen","Dongemond","Ossenisse","Kreekrak","Den Osse","Gouden Ham",
+          "Vinkeveen","Lac de Robertville","Barrage de l'Eau d'Heure","Floreffe","Zeeland Brug","Bergse Diepsluis","Scharendijke","Nemo33"]
+
+def _workbook(frame):
+    # write-only openpyxl laat <dimension> weg; Excel en de app zelf (to_excel) schrijven die wel,
+    # en de opslag gebruikt hem om de basisrijen te tellen. Zo lijken de testbestanden op echte.
+    import exports
+    from openpyxl.utils import get_column_letter
+    src = zipfile.ZipFile(io.BytesIO(exports.frame_xlsx(frame, "Sheet1")))
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as out:
+        for item in src.infolist():
+            data = src.read(item)
+            if item.filename == "xl/worksheets/sheet1.xml":
+                ref = f"A1:{get_column_letter(max(1, frame.shape[1]))}{len(frame) + 1}"
+                data = data.replace(b"</sheetPr>", f'</sheetPr><dimension ref="{ref}" />'.encode(), 1)
+            out.writestr(item, data)
+    return buf.getvalue()
+
+def generate(path, dives, seed=1):
+    # clubavonden: een datum + plaats met 2 tot 12 duikers uit een vaste ledenlijst; duikers en
+    # plaatsen groeien mee met de data (grote datasets = meerdere clubs / langere historiek)
+    import numpy as np
+    import pandas as pd
+    import auth
+    rng = np.random.default_rng(seed)
+    path = Path(path); path.mkdir(parents=True, exist_ok=True)
+    n_divers = max(40, min(5000, dives // 200))
+    divers = [f"{FIRST[i % len(FIRST)]} {LAST[(i // len(FIRST)) % len(LAST)]}" + (f" {i // (len(FIRST) * len(LAST)) + 1}" if i >= len(FIRST) * len(LAST) else "")
+              for i in range(n_divers)]
+    places = PLACES + [f"{p} {i}" for i in range(2, max(1, dives // 50_000) + 1) for p in PLACES]
+    sizes = rng.integers(2, 13, size=dives // 2 + 1)
+    sizes = sizes[:np.searchsorted(np.cumsum(sizes), dives) + 1]
+    n_occ = len(sizes)
+    years = max(2, dives // 20_000)
+    start = np.datetime64(datetime.date.today() - datetime.timedelta(days=365 * years))
+    days = np.sort(rng.integers(0, 365 * years, size=n_occ))
+    occ_date = (start + days.astype("timedelta64[D]")).astype("datetime64[ns]")
+    occ_place = rng.zipf(1.6, size=n_occ) % len(places)
+    idx = np.repeat(np.arange(n_occ), sizes)[:dives]
+    diver = rng.zipf(1.3, size=dives) % n_divers
+    df = pd.DataFrame({"Datum": occ_date[idx], "Plaats": np.array(places, dtype=object)[occ_place[idx]],
+                       "Duiker": np.array(divers, dtype=object)[diver]})
+    (path / "duiken.xlsx").write_bytes(_workbook(df))
+    (path / "duikers.xlsx").write_bytes(_workbook(pd.DataFrame({"Naam": divers})))
+    (path / "duikplaatsen.xlsx").write_bytes(_workbook(pd.DataFrame({"Plaats": places})))
+    hashed = auth.hash_password("bench")
+    users = pd.DataFrame({"Username": ["admin"] + [f"lid{i}" for i in range(min(200, n_divers))], "PasswordHash": hashed,
+                          "Role": ["admin"] + ["user"] * min(200, n_divers), "FailedAttempts": 0, "LockedUntil": ""})
+    (path / "users.xlsx").write_bytes(_workbook(users))
+    (path / "meta.json").write_text(json.dumps({"dives": len(df), "divers": n_divers, "places": len(places), "seed": seed}))
+    return path
+
+def dataset(data_dir, dives, seed):
+    path = Path(data_dir) / f"{dives}-{seed}"
+    if not (path / "meta.json").exists():
+        t = time.perf_counter(); generate(path, dives, seed)
+        print(f"  data {dives}: gegenereerd in {time.perf_counter() - t:.1f}s", file=sys.stderr)
+    return path
+
+# ---------- metingen (in het kindproces) ----------
+
+def measure(name, fn, repeat, results, setup=None):
+    runs = []
+    for _ in range(repeat):
+        if setup: setup()
+        t = time.perf_counter(); fn(); runs.append(time.perf_counter() - t)
+    if setup: setup()
+    tracemalloc.start(); tracemalloc.reset_peak()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]; tracemalloc.stop()
+    results.append({"step": name, "wall_s": statistics.median(runs), "runs": runs, "peak_mb": round(peak / 2**20, 2)})
+    print(f"  · {name:<24} {statistics.median(runs) * 1000:10.1f} ms  {peak / 2**20:8.1f} MB", file=sys.stderr)
+
+# De app-functies hangen aan st.cache_*: die cachen enkel binnen een Streamlit-runtime. Daarom
+# draait elke stap als klein script in AppTest; de context (tabel, periode, ...) wordt één keer
+# opgebouwd en de resultaten worden in deze module bijgehouden.
+_results, _ctx = [], {}
+
+def _context():
+    import pandas as pd
+    import storage
+    import app
+    if _ctx: return _ctx
+    tbl = app.load_duiken()
+    end = tbl.max_date; start = end - datetime.timedelta(days=365)
+    plaats = tbl.places[0]
+    alles = (None, start, end, "Alle", "Alle")
+    version = lambda: app.dataset_version(app.DUIKEN_FILE)
+    one = pd.DataFrame({"Datum": [pd.Timestamp(end)], "Plaats": [plaats], "Duiker": [tbl.divers[0]]})
+    duikers = app.load_duikers()
+    def fresh_backend():
+        Path(storage.DB_FILE).unlink(missing_ok=True); storage._backend = storage._writer = None
+        app.settlement_aggregate.clear(); app._load_duiken.clear()
+    _ctx.update({
+        "migrate": (app.load_duiken, fresh_backend),
+        "load_duiken_cold": (app.load_duiken, app._load_duiken.clear),
+        "load_duiken_warm": (app.load_duiken, None),
+        "overzicht_filter": (lambda: app.overzicht_selectie(tbl, None, start, end, plaats, "Alle"), None),
+        "overzicht_sort": (lambda: app.overzicht_sorted(version(), alles, "Duiker", True), app.overzicht_sorted.clear),
+        "afrekening_rebuild": (app.load_settlement, lambda: setattr(app.settlement_aggregate(), "version", None)),
+        "afrekening_period": (lambda: app.load_settlement().period(start, end), None),
+        "export_overzicht_xlsx": (lambda: app.export_overzicht(version(), alles, "xlsx"), app.export_overzicht.clear),
+        "export_afrekening_xlsx": (lambda: app.export_afrekening(version(), start, end, "Alle", 5.0), app.export_afrekening.clear),
+        "save_duiken": (lambda: app.save_duiken(one), None),
+        "save_file_duikers": (lambda: app.save_file(app.DUIKERS_FILE, duikers), None),
+    })
+    return _ctx
+
+def _step(name, repeat):
+    fn, setup = _context()[name]
+    measure(name, fn, repeat if name != "migrate" else 1, _results, setup)
+
+def _step_script(name, repeat):
+    import bench
+    bench._step(name, repeat)
+
+def cold_one(page):
+    # nieuw proces = herstart van de server: streamlit importeren (in productie al geladen door
+    # de server) en daarna de eerste run van het script tot de pagina getekend is
+    t0 = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    t1 = time.perf_counter()
+    at = AppTest.from_file(str(HERE / "app.py"), default_timeout=600)
+    if page != "Login":
+        at.session_state["logged_in"] = True; at.session_state["username"] = "admin"; at.session_state["role"] = "admin"
+        at.session_state["page_state"] = {"nav_page": page}
+    at.run(); assert not at.exception, at.exception
+    return {"import_s": t1 - t0, "paint_s": time.perf_counter() - t1, "pandas_loaded": "pandas" in sys.modules}
+
+def measure_cold(name, page, repeat, results, work, fresh=False):
+    runs, info = [], {}
+    for _ in range(repeat):
+        # fresh: ook de afgeleide caches weg (eerste start na een deploy)
+        if fresh:
+            for f in Path(work).glob("*.sidecar.*"): f.unlink()
+        part = Path(tempfile.mkstemp(suffix=".json")[1])
+        proc = subprocess.run([sys.executable, str(HERE / "bench.py"), "--cold", page, "--out", str(part)], cwd=work, capture_output=True, text=True)
+        if proc.returncode: raise RuntimeError(proc.stderr)
+        info = json.loads(part.read_text()); part.unlink()
+        runs.append(info["paint_s"])
+    results.append({"step": name, "wall_s": statistics.median(runs), "runs": runs, "peak_mb": None,
+                    "import_streamlit_s": info["import_s"], "pandas_loaded": info["pandas_loaded"]})
+    print(f"  · {name:<24} {statistics.median(runs) * 1000:10.1f} ms  (pandas geladen: {info['pandas_loaded']})", file=sys.stderr)
+
+def run_one(data, backend, repeat):
+    # werkkopie van de data: de benchmark schrijft (opslaan, login)
+    work = Path(tempfile.mkdtemp(prefix="duikbench-"))
+    for f in Path(data).glob("*.xlsx"): shutil.copy(f, work)
+    os.chdir(work); sys.path.insert(0, str(HERE))
+    os.environ.update({"DUIKAPP_BACKEND": backend, "DUIKAPP_BACKUP_INTERVAL_HOURS": "0"})
+    import bench
+    from streamlit.testing.v1 import AppTest
+    steps = (["migrate"] if backend == "sqlite" else []) + ["load_duiken_cold", "load_duiken_warm", "overzicht_filter", "overzicht_sort",
+             "afrekening_rebuild", "afrekening_period", "export_overzicht_xlsx", "export_afrekening_xlsx", "save_duiken", "save_file_duikers"]
+    for name in steps:
+        at = AppTest.from_function(_step_script, args=(name, repeat), default_timeout=3600).run()
+        assert not at.exception, at.exception
+    results = bench._results
+
+    def login():
+        at = AppTest.from_file(str(HERE / "app.py"), default_timeout=600).run()
+        at.text_input(key="login_user").input("admin"); at.text_input(key="login_pw").input("bench")
+        at.button(key="login_btn").click().run()
+        assert not at.exception and at.session_state["logged_in"], at.exception
+    measure("login", login, repeat, results)
+
+    def page(name):
+        def run():
+            at = AppTest.from_file(str(HERE / "app.py"), default_timeout=600)
+            at.session_state["logged_in"] = True; at.session_state["username"] = "admin"; at.session_state["role"] = "admin"
+            at.session_state["page_state"] = {"nav_page": name}
+            at.run(); assert not at.exception, at.exception
+        return run
+    for name in ["Duiken invoeren", "Overzicht", "Afrekening"]:
+        measure(f"page_{name.split()[0].lower()}", page(name), repeat, results)
+    # koude start: tijd tot de eerste getekende pagina in een nieuw proces
+    measure_cold("cold_login", "Login", repeat, results, work)
+    measure_cold("cold_overzicht_deploy", "Overzicht", repeat, results, work, fresh=True)
+    measure_cold("cold_overzicht", "Overzicht", repeat, results, work)
+    shutil.rmtree(work, ignore_errors=True)
+    return results
+
+# ---------- aansturing ----------
+
+def meta(backend):
+    import pandas, streamlit
+    try: commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True, text=True).stdout.strip()
+    except OSError: commit = ""
+    return {"created": datetime.datetime.utcnow().isoformat(timespec="seconds"), "commit": commit, "backend": backend,
+            "python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+            "pandas": pandas.__version__, "streamlit": streamlit.__version__}
+
+def compare(current, baseline, tolerance):
+    base = {(r["size"], r["step"]): r for r in baseline["results"]}
+    regressions = []
+    for r in current["results"]:
+        b = base.get((r["size"], r["step"]))
+        if not b: continue
+        ratio = r["wall_s"] / b["wall_s"] if b["wall_s"] else float("inf")
+        flag = ratio > tolerance and r["wall_s"] - b["wall_s"] > 0.005
+        if flag: regressions.append(r)
+        print(f"{r['size']:>9} {r['step']:<24} {b['wall_s'] * 1000:10.1f} -> {r['wall_s'] * 1000:10.1f} ms  x{ratio:5.2f}{'  REGRESSIE' if flag else ''}")
+    return regressions
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark van de duikapp op synthetische data")
+    ap.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    ap.add_argument("--backend", choices=["excel", "sqlite"], default="excel")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--data-dir", default=str(HERE / "bench_data"))
+    ap.add_argument("--out", default="bench.json")
+    ap.add_argument("--baseline", help="vorige resultaten om mee te vergelijken")
+    ap.add_argument("--tolerance", type=float, default=1.25, help="toegelaten vertraging t.o.v. de baseline (factor)")
+    ap.add_argument("--run-one", help=argparse.SUPPRESS)
+    ap.add_argument("--cold", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.cold:
+        sys.path.insert(0, str(HERE))
+        Path(args.out).write_text(json.dumps(cold_one(args.cold))); return
+    if args.run_one:
+        results = run_one(args.run_one, args.backend, args.repeat)
+        try: import resource; rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # kB op Linux
+        except ImportError: rss = None
+        Path(args.out).write_text(json.dumps({"results": results, "rss_peak_mb": rss})); return
+    sys.path.insert(0, str(HERE))
+    out = {"meta": meta(args.backend), "results": []}
+    for size in args.sizes:
+        data = dataset(args.data_dir, size, args.seed)
+        print(f"  {size} duiken ({args.backend})", file=sys.stderr)
+        t = time.perf_counter()
+        part = Path(tempfile.mkstemp(suffix=".json")[1])
+        proc = subprocess.run([sys.executable, __file__, "--run-one", str(data.resolve()), "--backend", args.backend,
+                               "--repeat", str(args.repeat), "--out", str(part)], capture_output=True, text=True)
+        if proc.returncode:
+            sys.stderr.write(proc.stderr); sys.exit(proc.returncode)
+        sys.stderr.write("\n".join(l for l in proc.stderr.splitlines() if l.startswith("  · ")) + "\n")
+        info = json.loads((data / "meta.json").read_text())
+        child = json.loads(part.read_text()); part.unlink()
+        out["results"] += [{"size": size, **r} for r in child["results"]]
+        out.setdefault("datasets", {})[str(size)] = {**info, "total_s": round(time.perf_counter() - t, 2), "rss_peak_mb": child["rss_peak_mb"]}
+    Path(args.out).write_text(json.dumps(out, indent=1))
+    print(f"resultaten in {args.out}", file=sys.stderr)
+    if args.baseline:
+        if compare(out, json.loads(Path(args.baseline).read_text()), args.tolerance): sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import io
+import difflib
+import datetime
+import numpy as np
+import pandas as pd
+
+COLUMNS = ["Datum", "Plaats", "Duiker"]
+MAX_SUGGESTIONS = 3
+EXCEL_MAX_SERIAL = 2958465  # 31/12/9999
+
+# Bulkimport van historische duiken: één gevectoriseerde controle over het hele bestand,
+# onbekende namen met suggesties, ontdubbelen via een hash-join en daarna één schrijfbatch.
+
+def read_upload(name, data):
+    if name.lower().endswith((".xlsx", ".xlsm")):
+        df = pd.read_excel(io.BytesIO(data), engine="openpyxl", dtype=object)
+    else:
+        head = data[:4096].decode("utf-8-sig", errors="replace").splitlines()[0] if data else ""
+        sep = max([";", ",", "\t"], key=head.count)
+        df = pd.read_csv(io.BytesIO(data), sep=sep, dtype=str, keep_default_na=False, encoding="utf-8-sig")
+    cols = {str(c).strip().lower(): c for c in df.columns}
+    missing = [c for c in COLUMNS if c.lower() not in cols]
+    if missing: raise ValueError(f"Kolom(men) ontbreken: {', '.join(missing)}")
+    return df[[cols[c.lower()] for c in COLUMNS]].set_axis(COLUMNS, axis=1)
+
+def _names(col):
+    s = col.astype(object).where(col.notna(), "").astype(str).str.strip()
+    return s.str.replace(r"\s+", " ", regex=True)
+
+def _dates(col):
+    if pd.api.types.is_datetime64_any_dtype(col): return pd.to_datetime(col).dt.normalize()
+    # Excel-cellen komen als datetime-objecten binnen, tekst als jjjj-mm-dd of dd/mm/jjjj, getallen als
+    # Excel-serienummer. Elk formaat expliciet: to_datetime leidt anders het formaat af uit de eerste
+    # waarde en verwisselt dan dag en maand in de rest.
+    is_dt = col.map(lambda v: isinstance(v, (datetime.date, pd.Timestamp)))
+    parsed = pd.to_datetime(col.where(is_dt), errors="coerce")
+    text = col.where(~is_dt & col.notna()).astype(object).where(lambda s: s.notna(), "").astype(str).str.strip()
+    rest = parsed.isna() & text.ne("")
+    serial = pd.to_numeric(text.where(rest), errors="coerce")
+    serial = serial.where(serial.between(1, EXCEL_MAX_SERIAL))
+    parsed[serial.notna()] = pd.to_datetime(serial.dropna(), unit="D", origin="1899-12-30")
+    for fmt in ("ISO8601", "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y"):
+        rest = parsed.isna() & text.ne("")
+        if not rest.any(): break
+        parsed[rest] = pd.to_datetime(text[rest], errors="coerce", format=fmt)
+    return parsed.dt.normalize()
+
+def suggestions(name, known, lower):
+    exact = lower.get(name.lower())
+    if exact is not None: return [exact]
+    return difflib.get_close_matches(name, known, n=MAX_SUGGESTIONS, cutoff=0.75)
+
+def _keys(datum, plaats, duiker):
+    frame = pd.DataFrame({"d": pd.DatetimeIndex(datum).asi8, "p": np.asarray(plaats, dtype=object), "n": np.asarray(duiker, dtype=object)})
+    return pd.util.hash_pandas_object(frame, index=False).to_numpy()
+
+class ImportPlan:
+    def __init__(self, raw, known_divers, known_places):
+        self.total = len(raw)
+        datum, plaats, duiker = _dates(raw["Datum"]), _names(raw["Plaats"]), _names(raw["Duiker"])
+        reason = pd.Series("", index=raw.index, dtype=object)
+        reason[duiker.eq("")] = "geen duiker"
+        reason[plaats.eq("")] = "geen duikplaats"
+        reason[datum.isna()] = "ongeldige datum"
+        bad = reason.ne("").to_numpy()
+        # rijnummers zoals in Excel: kopregel is rij 1
+        self.invalid = pd.DataFrame({"Rij": np.flatnonzero(bad) + 2, "Datum": raw["Datum"].to_numpy()[bad],
+                                     "Plaats": plaats.to_numpy()[bad], "Duiker": duiker.to_numpy()[bad], "Reden": reason.to_numpy()[bad]})
+        self.rows = pd.DataFrame({"Datum": datum.to_numpy()[~bad], "Plaats": plaats.to_numpy()[~bad], "Duiker": duiker.to_numpy()[~bad]})
+        self.unknown = []
+        for kind, col, known in (("Duiker", "Duiker", known_divers), ("Duikplaats", "Plaats", known_places)):
+            known = [str(k) for k in known]
+            lower = {k.lower(): k for k in known}
+            for name in sorted(set(self.rows[col].unique()) - set(known)):
+                sug = suggestions(name, known, lower)
+                self.unknown.append({"Soort": kind, "Naam": name, "Suggestie": sug[0] if sug else "",
+                                     "Alternatieven": ", ".join(sug[1:]),
+                                     # enkel een zuiver hoofdlettervariant automatisch koppelen; de rest nieuw aanmaken
+                                     "Suggestie gebruiken": bool(sug) and sug[0].lower() == name.lower()})
+
+    def resolve(self, choices, existing_keys, known_divers, known_places):
+        # choices: rijen van de tabel met onbekende namen (na bewerking). Een gekozen suggestie
+        # vervangt de naam; wat daarna nog onbekend is, wordt nieuw aangemaakt.
+        mapping = {"Duiker": {}, "Duikplaats": {}}
+        for c in choices:
+            target = str(c["Suggestie"] or "").strip()
+            if c["Suggestie gebruiken"] and target: mapping[c["Soort"]][c["Naam"]] = target
+        rows = self.rows.copy()
+        if mapping["Duiker"]: rows["Duiker"] = rows["Duiker"].replace(mapping["Duiker"])
+        if mapping["Duikplaats"]: rows["Plaats"] = rows["Plaats"].replace(mapping["Duikplaats"])
+        new_divers = sorted(set(rows["Duiker"].unique()) - {str(k) for k in known_divers})
+        new_places = sorted(set(rows["Plaats"].unique()) - {str(k) for k in known_places})
+        keys = _keys(rows["Datum"], rows["Plaats"], rows["Duiker"])
+        in_file = pd.Series(keys).duplicated().to_numpy()
+        existing = np.isin(keys, existing_keys) & ~in_file
+        keep = ~(in_file | existing)
+        out = pd.DataFrame({"Datum": pd.DatetimeIndex(rows["Datum"].to_numpy()[keep]).date,
+                            "Plaats": rows["Plaats"].to_numpy()[keep], "Duiker": rows["Duiker"].to_numpy()[keep]})
+        return out, new_divers, new_places, {"in_bestand": int(in_file.sum()), "bestaand": int(existing.sum())}
+
+def table_keys(tbl):
+    # hash per bestaande duik (dag, plaats, duiker) voor de join met de importrijen
+    df = tbl.df
+    return _keys(df.index, df["Plaats"].astype(object).to_numpy(), df["Duiker"].astype(object).to_numpy())
@@ -0,0 +1,95 @@
+from functools import cached_property
+import numpy as np
+import pandas as pd
+
+def parse_dates(col):
+    # ISO8601: de SQLite-backend bewaart jjjj-mm-dd en jjjj-mm-ddTuu:mm:ss door elkaar. Zonder vast formaat
+    # leidt pandas het formaat af uit de eerste waarde en wordt elke waarde in het andere formaat NaT.
+    return pd.to_datetime(col, errors="coerce", format="ISO8601")
+
+# Genormaliseerde, gedeelde duikentabel: één keer per dataversie opgebouwd en door alle
+# sessies gelezen. Niet wijzigen; wie een aangepaste kopie nodig heeft, gebruikt to_frame().
+class DiveTable:
+    def __init__(self, raw):
+        datum = parse_dates(raw["Datum"]).dt.normalize()
+        keep = datum.notna().to_numpy()
+        # rijen zonder leesbare datum niet stilzwijgend laten vallen: de pagina's melden ze
+        self.invalid = raw.loc[~keep].reindex(columns=["Datum", "Plaats", "Duiker"])
+        order = np.argsort(datum.to_numpy()[keep], kind="stable")
+        self.df = pd.DataFrame({
+            "Plaats": pd.Categorical(raw["Plaats"].to_numpy()[keep][order]),
+            "Duiker": pd.Categorical(raw["Duiker"].to_numpy()[keep][order]),
+            "RowId": raw.index.to_numpy()[keep][order],
+        }, index=pd.DatetimeIndex(datum.to_numpy()[keep][order], name="Datum"))
+        if len(self.df): self.range(self.df.index[0], self.df.index[0])  # index-engine hier al opbouwen, niet bij de eerste filter
+
+    def __len__(self):
+        return len(self.df)
+
+    @property
+    def empty(self):
+        return self.df.empty
+
+    @property
+    def min_date(self):
+        return self.df.index[0].date() if len(self.df) else None
+
+    @property
+    def max_date(self):
+        return self.df.index[-1].date() if len(self.df) else None
+
+    @cached_property
+    def places(self):
+        return [str(p) for p in self.df["Plaats"].cat.categories]
+
+    @cached_property
+    def divers(self):
+        return [str(d) for d in self.df["Duiker"].cat.categories]
+
+    @cached_property
+    def occasions(self):
+        # unieke (datum, plaats)-combinaties, recentste eerst
+        df = self.df[self.df["Plaats"].notna()]
+        pairs = pd.DataFrame({"Datum": df.index, "Plaats": df["Plaats"].cat.codes.to_numpy()}).drop_duplicates()
+        pairs = pairs.sort_values(["Datum", "Plaats"], ascending=[False, True])
+        cats = self.df["Plaats"].cat.categories
+        return [(d.date(), cats[c]) for d, c in zip(pairs["Datum"], pairs["Plaats"])]
+
+    def _code(self, col, value):
+        try: return self.df[col].cat.categories.get_loc(value)
+        except KeyError: return -2
+
+    def range(self, start=None, end=None):
+        if start is None and end is None: return self.df
+        lo = pd.Timestamp(start) if start is not None else None
+        hi = pd.Timestamp(end) if end is not None else None
+        return self.df.loc[lo:hi]
+
+    def select(self, start=None, end=None, plaats=None, duiker=None):
+        df = self.range(start, end)
+        if plaats is not None: df = df[df["Plaats"].cat.codes.to_numpy() == self._code("Plaats", plaats)]
+        if duiker is not None: df = df[df["Duiker"].cat.codes.to_numpy() == self._code("Duiker", duiker)]
+        return df
+
+    def by_place(self, plaats, start=None, end=None):
+        return self.select(start, end, plaats=plaats)
+
+    def by_date_place(self, datum, plaats):
+        return self.select(datum, datum, plaats=plaats)
+
+    @staticmethod
+    def ordered(sub, by="Datum", descending=False):
+        # sorteren via de categorische codes (categorieën zijn alfabetisch); daarna op de overige kolommen
+        keys = {"Datum": sub.index.asi8, "Plaats": sub["Plaats"].cat.codes.to_numpy(), "Duiker": sub["Duiker"].cat.codes.to_numpy()}
+        order = [by] + [c for c in ("Datum", "Plaats", "Duiker") if c != by]
+        idx = np.lexsort(tuple(keys[c] for c in reversed(order)))
+        return sub.iloc[idx[::-1] if descending else idx]
+
+    @staticmethod
+    def to_frame(sub):
+        # zelfde vorm als de ruwe tabel: Datum als datetime.date, index = RowId
+        return pd.DataFrame({
+            "Datum": sub.index.date,
+            "Plaats": sub["Plaats"].astype(object).to_numpy(),
+            "Duiker": sub["Duiker"].astype(object).to_numpy(),
+        }, index=pd.Index(sub["RowId"].to_numpy(), name=None))
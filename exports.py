@@ -0,0 +1,44 @@
+import io
+from openpyxl import Workbook
+
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Write-only werkboeken: openpyxl schrijft elke rij meteen weg naar een tijdelijk bestand
+# in plaats van alle cellen in het geheugen te houden, dus geheugen groeit niet met het blad.
+
+CHUNK_ROWS = 10_000
+
+def _rows(frame, columns):
+    # per blok van CHUNK_ROWS rijen naar Python-waarden omzetten: nooit het hele blad tegelijk als lijsten
+    for start in range(0, len(frame), CHUNK_ROWS):
+        part = frame.iloc[start:start + CHUNK_ROWS]
+        yield from zip(*[part[c].astype(object).where(part[c].notna(), None).tolist() for c in columns])
+
+def _save(wb):
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+def frame_xlsx(frame, sheet_name):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(sheet_name)
+    columns = list(frame.columns)
+    ws.append(columns)
+    for row in _rows(frame, columns): ws.append(row)
+    return _save(wb)
+
+def frame_csv(frame):
+    return frame.to_csv(index=False).encode("utf-8")
+
+def settlement_xlsx(detail, bedrag):
+    # één doorloop over de detailrijen vult het Detail-blad en telt meteen per duiker
+    wb = Workbook(write_only=True)
+    ws_sum, ws_det = wb.create_sheet("Afrekening"), wb.create_sheet("Detail")
+    ws_det.append(["Datum","Plaats","Duiker"])
+    counts = {}
+    for row in _rows(detail, ["Datum","Plaats","Duiker"]):
+        ws_det.append(row)
+        counts[row[2]] = counts.get(row[2], 0) + 1
+    ws_sum.append(["Duiker","AantalDuiken","Bedrag"])
+    for naam in sorted(counts, key=str): ws_sum.append([naam, counts[naam], round(counts[naam]*bedrag, 2)])
+    return _save(wb)
@@ -0,0 +1,103 @@
+import os
+import json
+import time
+import threading
+import datetime
+from collections import deque
+
+PERF_ENABLED = os.environ.get("DUIKAPP_PERF", "1") != "0"
+PERF_WINDOW = int(os.environ.get("DUIKAPP_PERF_WINDOW", "500"))
+PERF_LOG = os.environ.get("DUIKAPP_PERF_LOG", "")
+
+# Tijdmetingen per span (loader, opslag, pagina, export, ...), per serverproces bijgehouden:
+# de laatste PERF_WINDOW duren per span voor rollende percentielen, plus cache-hits/-misses en
+# het laatst gemelde aantal rijen. Uitgeschakeld kost een span enkel een attribuutcheck.
+
+enabled = PERF_ENABLED
+_lock = threading.Lock()
+_spans = {}
+_local = threading.local()
+_log = None
+log_path = ""
+
+class _Noop:
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+    def note(self, **attrs): pass
+
+_NOOP = _Noop()
+
+class _Span:
+    __slots__ = ("name", "attrs", "t0")
+
+    def __init__(self, name, attrs):
+        self.name, self.attrs = name, attrs
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None: stack = _local.stack = []
+        stack.append(self)
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        ms = (time.perf_counter() - self.t0) * 1000
+        _local.stack.pop()
+        # st.rerun/st.stop zijn BaseExceptions (controleflow), geen fout
+        if exc_type is not None and issubclass(exc_type, Exception): self.attrs["fout"] = exc_type.__name__
+        _record(self.name, ms, self.attrs)
+        return False
+
+    def note(self, **attrs):
+        self.attrs.update(attrs)
+
+def span(name, **attrs):
+    return _Span(name, attrs) if enabled else _NOOP
+
+def note(**attrs):
+    # attributen op de binnenste lopende span van deze thread (bv. cache="miss" vanuit een cachefunctie)
+    stack = getattr(_local, "stack", None)
+    if enabled and stack: stack[-1].attrs.update(attrs)
+
+def _record(name, ms, attrs):
+    with _lock:
+        s = _spans.get(name)
+        if s is None: s = _spans[name] = {"ms": deque(maxlen=PERF_WINDOW), "count": 0, "hits": 0, "misses": 0, "rows": None}
+        s["ms"].append(ms); s["count"] += 1
+        cache = attrs.get("cache")
+        if cache == "hit": s["hits"] += 1
+        elif cache == "miss": s["misses"] += 1
+        if "rows" in attrs: s["rows"] = attrs["rows"]
+        if _log is not None:
+            _log.write(json.dumps({"ts": datetime.datetime.utcnow().isoformat(timespec="milliseconds"), "span": name,
+                                   "ms": round(ms, 3), **attrs}, default=str) + "\n")
+
+def stats():
+    import numpy as np
+    import pandas as pd
+    with _lock: snap = {n: (np.array(s["ms"]), s["count"], s["hits"], s["misses"], s["rows"]) for n, s in _spans.items()}
+    rows = []
+    for name, (ms, count, hits, misses, nrows) in sorted(snap.items()):
+        p50, p90, p99 = np.percentile(ms, [50, 90, 99]) if len(ms) else (np.nan,) * 3
+        rows.append({"Span": name, "Aantal": count, "p50 (ms)": round(p50, 1), "p90 (ms)": round(p90, 1), "p99 (ms)": round(p99, 1),
+                     "Max (ms)": round(ms.max(), 1) if len(ms) else np.nan, "Hits": hits, "Misses": misses,
+                     "Rijen": nrows})
+    out = pd.DataFrame(rows, columns=["Span","Aantal","p50 (ms)","p90 (ms)","p99 (ms)","Max (ms)","Hits","Misses","Rijen"])
+    out["Rijen"] = out["Rijen"].astype("Int64")
+    return out
+
+def reset():
+    with _lock: _spans.clear()
+
+def set_enabled(on):
+    global enabled
+    enabled = bool(on)
+
+def set_log(path):
+    # JSON-lines export: één regel per afgeronde span, regelgebufferd naar een lokaal bestand
+    global _log, log_path
+    with _lock:
+        if _log is not None: _log.close()
+        _log, log_path = (open(path, "a", encoding="utf-8", buffering=1), path) if path else (None, "")
+
+if PERF_LOG: set_log(PERF_LOG)
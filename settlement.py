@@ -0,0 +1,187 @@
+import datetime
+import threading
+import numpy as np
+import pandas as pd
+import dives
+
+EPOCH = datetime.date(1970, 1, 1).toordinal()
+
+def _month(day):
+    return day.year * 12 + day.month - 1
+
+# sleutel per (plaats, duiker, maand) in één int64; gesorteerd zijn alle maanden van één
+# (plaats, duiker)-paar aaneengesloten en de paren van één plaats ook
+_PB, _DB = 45, 24
+_DMASK, _MMASK = (1 << (_PB - _DB)) - 1, (1 << _DB) - 1
+
+def _key(p, d, m):
+    return (np.asarray(p, dtype=np.int64) << _PB) | (np.asarray(d, dtype=np.int64) << _DB) | np.asarray(m, dtype=np.int64)
+
+# Aantal duiken per (dag, plaats, duiker), bijgehouden bij elke opslag/verwijdering.
+# Naast de dagtellers (per maand gegroepeerd) zijn er maandtellers per (plaats, duiker, maand),
+# enkel voor combinaties die voorkomen (ijl: geheugen groeit met de data, niet met
+# maanden x plaatsen x duikers). Per paar is er een cumulatieve som over de maanden, zodat een
+# periode bestaat uit het verschil van twee opzoekingen per paar plus de dagtellers van hooguit
+# twee randmaanden.
+class SettlementAggregate:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.version = None
+        self.skipped = 0  # duiken met een duiker maar zonder leesbare datum: tellen niet mee
+        self._reset()
+
+    def _reset(self):
+        self.places, self.divers = {}, {}
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.mval = np.zeros(0, dtype=np.int64)
+        self.daily = {}
+        self._derive()
+
+    def _derive(self):
+        # afgeleide arrays: begin van elk paar en de cumulatieve telling binnen het paar
+        pair = self.keys >> _DB
+        self.pair_start = np.flatnonzero(np.r_[True, pair[1:] != pair[:-1]]) if len(pair) else np.zeros(0, dtype=np.int64)
+        self.pair_keys = pair[self.pair_start]
+        c = np.cumsum(self.mval)
+        base = np.r_[0, c][self.pair_start]
+        self.cumv = c - np.repeat(base, np.diff(np.r_[self.pair_start, len(c)]))
+
+    def _code(self, codes, name):
+        key = None if name is None or (isinstance(name, float) and pd.isna(name)) else name
+        if key not in codes: codes[key] = len(codes)
+        return codes[key]
+
+    def rebuild(self, tbl, version):
+        with self.lock:
+            self._reset()
+            self.skipped = int(tbl.invalid["Duiker"].notna().sum())
+            df = tbl.df[tbl.df["Duiker"].notna()]
+            if len(df):
+                days = df.index.to_numpy().astype("datetime64[D]")
+                months = days.astype("datetime64[M]").astype(np.int64) + 1970 * 12
+                pcats, dcats = tbl.df["Plaats"].cat.categories, tbl.df["Duiker"].cat.categories
+                self.places = {None: 0, **{p: i + 1 for i, p in enumerate(pcats)}}
+                self.divers = {d: i for i, d in enumerate(dcats)}
+                pc = df["Plaats"].cat.codes.to_numpy().astype(np.int64) + 1
+                dc = df["Duiker"].cat.codes.to_numpy().astype(np.int64)
+                self.keys, self.mval = np.unique(_key(pc, dc, months), return_counts=True)
+                self.mval = self.mval.astype(np.int64)
+                self._derive()
+                g = pd.DataFrame({"m": months, "day": days.astype(np.int64), "p": pc, "d": dc}).groupby(["m", "day", "p", "d"]).size()
+                for m, part in g.groupby(level="m"):
+                    self.daily[int(m)] = {(int(day), int(p), int(d)): int(n) for (_, day, p, d), n in part.items()}
+            self.version = version
+
+    def _apply(self, rows, sign):
+        keys = []
+        for datum, plaats, duiker in zip(dives.parse_dates(rows["Datum"]), rows["Plaats"], rows["Duiker"]):
+            if duiker is None or (isinstance(duiker, float) and pd.isna(duiker)): continue
+            if pd.isna(datum): self.skipped += sign; continue
+            day = datum.date()
+            p, d = self._code(self.places, plaats), self._code(self.divers, duiker)
+            m = _month(day)
+            keys.append(int(_key(p, d, m)))
+            bucket = self.daily.setdefault(m, {})
+            key = (day.toordinal() - EPOCH, p, d)
+            n = bucket.get(key, 0) + sign
+            if n: bucket[key] = n
+            else: bucket.pop(key, None)
+            if not bucket: self.daily.pop(m, None)
+        if not keys: return
+        # maandtellers samenvoegen: bestaande sleutels ophogen, nieuwe in één keer invoegen
+        dk, dv = np.unique(np.array(keys, dtype=np.int64), return_counts=True)
+        dv = dv.astype(np.int64) * sign
+        pos = np.searchsorted(self.keys, dk)
+        hit = pos < len(self.keys)
+        hit[hit] = self.keys[pos[hit]] == dk[hit]
+        np.add.at(self.mval, pos[hit], dv[hit])
+        if (~hit).any():
+            self.keys = np.insert(self.keys, pos[~hit], dk[~hit])
+            self.mval = np.insert(self.mval, pos[~hit], dv[~hit])
+        self._derive()
+
+    def _upto(self, lo, hi, month):
+        # per paar in [lo, hi): cumulatieve telling t.e.m. maand `month`
+        if hi <= lo: return np.zeros(0, dtype=np.int64)
+        pos = np.searchsorted(self.keys, (self.pair_keys[lo:hi] << _DB) | month, side="right") - 1
+        ok = pos >= self.pair_start[lo:hi]
+        return np.where(ok, self.cumv[np.maximum(pos, 0)], 0)
+
+    def apply(self, before, after, added=None, removed=None):
+        # alleen toepassen als we exact de toestand van vóór de schrijfactie hebben; anders opnieuw opbouwen
+        with self.lock:
+            if self.version is None or self.version != before:
+                self.version = None; return False
+            if added is not None: self._apply(added, 1)
+            if removed is not None: self._apply(removed, -1)
+            self.version = after
+            return True
+
+    def period(self, start, end, plaats=None):
+        with self.lock:
+            totals = np.zeros(len(self.divers), dtype=np.int64)
+            if len(self.keys) and (plaats is None or plaats in self.places):
+                pc = None if plaats is None else self.places[plaats]
+                ms, me = _month(start), _month(end)
+                lo, hi = start.toordinal() - EPOCH, end.toordinal() - EPOCH
+                for m in {ms, me}:
+                    for (day, p, d), n in self.daily.get(m, {}).items():
+                        if lo <= day <= hi and (pc is None or p == pc): totals[d] += n
+                if me - ms > 1:
+                    a, b = (0, len(self.pair_keys)) if pc is None else np.searchsorted(self.pair_keys, [pc << (_PB - _DB), (pc + 1) << (_PB - _DB)])
+                    full = self._upto(a, b, me - 1) - self._upto(a, b, ms)
+                    totals += np.bincount(self.pair_keys[a:b] & _DMASK, weights=full, minlength=len(self.divers)).astype(np.int64)
+            names = sorted(self.divers, key=str)
+            codes = [self.divers[n] for n in names]
+        per = pd.DataFrame({"Duiker": names, "AantalDuiken": totals[codes] if codes else np.array([], dtype=np.int64)})
+        return per[per["AantalDuiken"] > 0].reset_index(drop=True)
+
+    @property
+    def empty(self):
+        return not self.daily
+
+    def _bound(self, pick):
+        with self.lock:
+            if not self.daily: return None
+            day = pick(k[0] for k in self.daily[pick(self.daily)])
+        return datetime.date.fromordinal(day + EPOCH)
+
+    @property
+    def min_date(self):
+        return self._bound(min)
+
+    @property
+    def max_date(self):
+        return self._bound(max)
+
+    @property
+    def place_names(self):
+        with self.lock:
+            ends = np.r_[self.pair_start[1:], len(self.keys)] - 1
+            present = set((self.pair_keys[self.cumv[ends] > 0] >> (_PB - _DB)).tolist()) if len(self.keys) else set()
+            return sorted((p for p, c in self.places.items() if p is not None and c in present), key=str)
+
+    def snapshot(self):
+        with self.lock:
+            places = {c: p for p, c in self.places.items()}
+            divers = {c: d for d, c in self.divers.items()}
+            return {(day, places[p], divers[d]): n for bucket in self.daily.values() for (day, p, d), n in bucket.items()}
+
+    def check(self, tbl):
+        # consistentiecontrole: vers opbouwen uit de ruwe tabel en vergelijken met de bijgehouden tellers
+        fresh = SettlementAggregate(); fresh.rebuild(tbl, self.version)
+        ours, theirs = self.snapshot(), fresh.snapshot()
+        problems = [f"{datetime.date.fromordinal(day + EPOCH)} · {p} · {d}: {ours.get((day, p, d), 0)} i.p.v. {theirs.get((day, p, d), 0)}"
+                    for (day, p, d) in sorted(set(ours) | set(theirs), key=str) if ours.get((day, p, d), 0) != theirs.get((day, p, d), 0)]
+        with self.lock:
+            places = {c: p for p, c in self.places.items()}
+            divers = {c: d for d, c in self.divers.items()}
+            monthly = {}
+            for m, bucket in self.daily.items():
+                for (_, p, d), n in bucket.items(): monthly[(m, p, d)] = monthly.get((m, p, d), 0) + n
+            for k, n in zip(self.keys.tolist(), self.mval.tolist()):
+                m, p, d = k & _MMASK, k >> _PB, (k >> _DB) & _DMASK
+                if monthly.pop((m, p, d), 0) != n:
+                    problems.append(f"maandtotaal {m} · {places[p]} · {divers[d]} klopt niet")
+            problems += [f"maandtotaal {m} · {places[p]} · {divers[d]} ontbreekt" for (m, p, d), n in monthly.items() if n]
+        return problems
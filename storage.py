@@ -0,0 +1,593 @@
+import os
+import io
+import json
+import time
+import queue
+import pickle
+import hashlib
+import sqlite3
+import logging
+import itertools
+import threading
+import datetime
+from concurrent.futures import Future
+from pathlib import Path
+from contextlib import closing
+import numpy as np
+import pandas as pd
+
+try: import fcntl
+except ImportError: fcntl = None
+try: import msvcrt
+except ImportError: msvcrt = None
+try: import pyarrow as pa, pyarrow.feather as feather
+except ImportError: pa = feather = None
+
+log = logging.getLogger(__name__)
+
+# Opslag-backend: "excel" (werkboeken zoals vroeger) of "sqlite" (één databasebestand, rij-per-rij)
+STORAGE_BACKEND = os.environ.get("DUIKAPP_BACKEND", "excel").lower()
+DB_FILE = os.environ.get("DUIKAPP_DB", "duikapp.db")
+
+INDEXES = {"duiken": ["Datum", "Plaats", "Duiker"]}
+
+# Excel-backend: mutaties gaan naar een journaal (JSON lines) naast het werkboek,
+# dat in de achtergrond in het werkboek wordt gevouwen zodra het te groot wordt.
+JOURNAL_COMPACT_AT = int(os.environ.get("DUIKAPP_JOURNAL_COMPACT_AT", "2000"))
+
+# Alle schrijfacties van één proces lopen via één schrijver-thread; wat binnen WRITE_WINDOW
+# seconden binnenkomt, wordt samen weggeschreven. LOCK_FILE serialiseert over processen heen.
+WRITE_WINDOW = float(os.environ.get("DUIKAPP_WRITE_WINDOW", "0.05"))
+LOCK_FILE = os.environ.get("DUIKAPP_LOCK", "duikapp.lock")
+
+# Een werkboek inlezen met openpyxl kost seconden bij grote bestanden. Naast elk werkboek staat
+# daarom een kolomgewijze kopie (Feather, gememorymapt ingelezen; pickle als een kolom niet naar
+# Arrow kan) met de mtime, grootte en sha256 van het werkboek waaruit ze gemaakt is.
+SIDECAR = os.environ.get("DUIKAPP_SIDECAR", "1") != "0"
+
+# shared=True voor lezers (enkel fcntl; msvcrt kent geen gedeelde locks en neemt dan een exclusieve).
+# Herintredend per thread: wie het slot al heeft (bv. de schrijver die in modify leest) neemt het niet opnieuw.
+class FileLock:
+    _held = threading.local()
+
+    def __init__(self, path=LOCK_FILE, shared=False):
+        self.path = path
+        self.shared = shared
+        self._fh = None
+
+    def __enter__(self):
+        held = self._held.__dict__.setdefault("paths", {})
+        key = os.path.abspath(self.path)
+        if held.get(key): held[key] += 1; return self
+        self._fh = open(self.path, "a+b")
+        if fcntl is not None: fcntl.flock(self._fh.fileno(), fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX)
+        elif msvcrt is not None: self._fh.seek(0); msvcrt.locking(self._fh.fileno(), msvcrt.LK_LOCK, 1)
+        held[key] = 1
+        return self
+
+    def __exit__(self, *exc):
+        held = self._held.paths
+        key = os.path.abspath(self.path)
+        held[key] -= 1
+        if held[key] or self._fh is None: return
+        del held[key]
+        try:
+            if fcntl is not None: fcntl.flock(self._fh.fileno(), fcntl.LOCK_UN)
+            elif msvcrt is not None: self._fh.seek(0); msvcrt.locking(self._fh.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self._fh.close(); self._fh = None
+
+def table_name(file):
+    return Path(file).stem
+
+def journal_path(file):
+    return Path(file).with_suffix(".journal.jsonl")
+
+def _tmp_path(path, suffix):
+    # eigen tijdelijk bestand per proces en thread: gelijktijdige schrijvers overschrijven elkaars werk niet
+    return Path(path).with_suffix(f".{os.getpid()}-{threading.get_ident()}{suffix}")
+
+def sidecar_path(file, ext="feather"):
+    return Path(file).with_suffix(f".sidecar.{ext}")
+
+def _load_sidecar(file):
+    p = sidecar_path(file)
+    try:
+        if feather is not None and p.exists():
+            table = feather.read_table(p, memory_map=True)
+            return json.loads(table.schema.metadata[b"duikapp"]), table.to_pandas()
+        p = sidecar_path(file, "pkl")
+        if p.exists():
+            with open(p, "rb") as fh: return pickle.load(fh)
+    except Exception:
+        log.warning("sidecar %s onleesbaar, wordt herbouwd", p, exc_info=True)
+    return None, None
+
+def _save_sidecar(file, meta, df):
+    tmp = _tmp_path(sidecar_path(file), ".tmp")
+    target = None
+    try:
+        if feather is not None:
+            try:
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                table = table.replace_schema_metadata({**(table.schema.metadata or {}), b"duikapp": json.dumps(meta).encode("utf-8")})
+                feather.write_feather(table, tmp, compression="uncompressed")
+                target = sidecar_path(file)
+            except (pa.ArrowException, TypeError, ValueError): pass
+        if target is None:
+            with open(tmp, "wb") as fh: pickle.dump((meta, df), fh, protocol=pickle.HIGHEST_PROTOCOL)
+            target = sidecar_path(file, "pkl")
+        os.replace(tmp, target)
+        for ext in ("feather", "pkl"):
+            if sidecar_path(file, ext) != target: sidecar_path(file, ext).unlink(missing_ok=True)
+    except OSError:
+        # bv. alleen-lezen map: gewoon zonder sidecar verder
+        log.warning("sidecar voor %s niet geschreven", file, exc_info=True)
+        tmp.unlink(missing_ok=True)
+
+def _to_sql_value(v):
+    if v is None or v is pd.NA or v is pd.NaT or (isinstance(v, float) and pd.isna(v)): return None
+    if isinstance(v, (pd.Timestamp, datetime.datetime)): return v.date().isoformat() if v.time() == datetime.time() else v.isoformat()
+    if isinstance(v, datetime.date): return v.isoformat()
+    if hasattr(v, "item"): return v.item()
+    return v
+
+def _to_json_value(v):
+    if v is pd.NaT: return None
+    if isinstance(v, (pd.Timestamp, datetime.datetime)) and v.time() == datetime.time(): v = v.date()
+    if isinstance(v, datetime.date) and not isinstance(v, datetime.datetime): return {"$date": v.isoformat()}
+    return _to_sql_value(v)
+
+def _from_json_value(v):
+    return datetime.date.fromisoformat(v["$date"]) if isinstance(v, dict) else v
+
+def _parse_journal(data):
+    # een laatste regel zonder newline is nog in aanmaak door een ander proces: overslaan
+    lines = data.split(b"\n")[:-1]
+    ops = [json.loads(line) for line in lines if line.strip()]
+    if ops and ops[0]["op"] == "base": return ops[0], ops[1:]
+    return {"op": "base", "rows": 0}, ops
+
+# Rij-ids blijven stabiel over compacties heen: de kop van het journaal bewaart de ids van
+# de werkboekrijen als reeksen [start, lengte] en het volgende vrije id, dat nooit hergebruikt wordt.
+def _id_runs(ids):
+    ids = np.asarray(ids, dtype=np.int64)
+    if not len(ids): return []
+    breaks = np.flatnonzero(np.diff(ids) != 1) + 1
+    starts, ends = np.concatenate([[0], breaks]), np.concatenate([breaks, [len(ids)]])
+    return [[int(ids[a]), int(b - a)] for a, b in zip(starts, ends)]
+
+def _base_ids(header):
+    runs = header.get("ids", [[0, header["rows"]]])
+    return np.concatenate([np.arange(a, a + n, dtype=np.int64) for a, n in runs]) if runs else np.array([], dtype=np.int64)
+
+def _next_id(header, ops):
+    return max([header.get("next", header["rows"])] + [op["id"] + 1 for op in ops if op["op"] == "add"])
+
+def _merge_journal(base, data):
+    # werkboekrijen krijgen hun id uit de kop, toegevoegde rijen het id uit het journaal; tombstones vallen weg
+    header, ops = _parse_journal(data)
+    ids = _base_ids(header)
+    if len(ids) == len(base): base = base.set_axis(ids)
+    if not ops: return base
+    adds = [op for op in ops if op["op"] == "add"]
+    dels = [op["id"] for op in ops if op["op"] == "del"]
+    df = base
+    if adds:
+        extra = pd.DataFrame([{c: _from_json_value(v) for c, v in op["row"].items()} for op in adds], index=[op["id"] for op in adds])
+        for c in extra.columns:
+            if c in base.columns and pd.api.types.is_datetime64_any_dtype(base[c]): extra[c] = pd.to_datetime(extra[c])
+        df = pd.concat([base, extra]) if len(base) else extra.reindex(columns=list(base.columns) + [c for c in extra.columns if c not in base.columns])
+    return df.drop(index=dels, errors="ignore")
+
+class ExcelBackend:
+    name = "excel"
+
+    def __init__(self, compact_at=JOURNAL_COMPACT_AT):
+        self.compact_at = compact_at
+        self._lock = threading.RLock()
+        self._state = {}
+        self._compacting = set()
+
+    def _base_rows(self, file):
+        if not Path(file).exists(): return 0
+        from openpyxl import load_workbook
+        wb = load_workbook(file, read_only=True)
+        try: n = wb.active.max_row
+        finally: wb.close()
+        if n is not None: return max(n - 1, 0)
+        with open(file, "rb") as fh: return len(self._read_base(file, fh))
+
+    def _write_base(self, file, df):
+        tmp = _tmp_path(file, ".tmp.xlsx")
+        try: df.to_excel(tmp, index=False, engine="openpyxl")
+        except BaseException: tmp.unlink(missing_ok=True); raise
+        os.replace(tmp, file)
+
+    def _write_journal(self, file, ops):
+        jp = journal_path(file); tmp = _tmp_path(jp, ".tmp")
+        tmp.write_text("".join(json.dumps(op) + "\n" for op in ops), encoding="utf-8")
+        os.replace(tmp, jp)
+        self._state[file] = {"size": jp.stat().st_size, "next_id": _next_id(ops[0], ops[1:]), "entries": len(ops) - 1}
+
+    def _journal_state(self, file):
+        # in-memory teller, opnieuw ingelezen als het journaal buiten ons om veranderde
+        jp = journal_path(file)
+        st = self._state.get(file)
+        if jp.exists():
+            size = jp.stat().st_size
+            if st is None or st["size"] != size:
+                header, ops = _parse_journal(jp.read_bytes())
+                st = self._state[file] = {"size": size, "next_id": _next_id(header, ops), "entries": len(ops)}
+        else:
+            self._write_journal(file, [{"op": "base", "rows": self._base_rows(file)}])
+            st = self._state[file]
+        return st
+
+    def _log(self, file, ops):
+        jp = journal_path(file)
+        with open(jp, "a", encoding="utf-8") as fh:
+            fh.write("".join(json.dumps(op) + "\n" for op in ops)); fh.flush(); os.fsync(fh.fileno())
+        st = self._state[file]
+        st["size"] = jp.stat().st_size; st["entries"] += len(ops)
+        if st["entries"] >= self.compact_at and file not in self._compacting:
+            self._compacting.add(file)
+            threading.Thread(target=self._compact_bg, args=(file,), daemon=True, name=f"compact-{table_name(file)}").start()
+
+    def _compact_bg(self, file):
+        try:
+            if not self.compact(file): return
+            # sidecar van het nieuwe werkboek meteen opbouwen, niet bij de volgende (koude) lezing
+            if SIDECAR:
+                with open(file, "rb") as fh: self._read_base(file, fh)
+        finally:
+            with self._lock: self._compacting.discard(file)
+
+    def _read_base(self, file, fh):
+        if not SIDECAR: return pd.read_excel(fh, engine="openpyxl")
+        # fstat van de open handle: het werkboek kan intussen atomair vervangen zijn
+        st = os.fstat(fh.fileno())
+        meta, df = _load_sidecar(file)
+        if meta is not None and (meta["mtime_ns"], meta["size"]) == (st.st_mtime_ns, st.st_size): return df
+        raw = fh.read()
+        digest = hashlib.sha256(raw).hexdigest()
+        # enkel een andere mtime (kopie, checkout) maar dezelfde inhoud: sidecar blijft geldig
+        if meta is None or meta["size"] != st.st_size or meta["sha256"] != digest:
+            df = pd.read_excel(io.BytesIO(raw), engine="openpyxl")
+        _save_sidecar(file, {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "sha256": digest}, df)
+        return df
+
+    def version(self, file):
+        # werkboek + journaal: elke mutatie of compactie wijzigt mtime/grootte van minstens één van beide
+        out = []
+        for p in (Path(file), journal_path(file)):
+            try: st = p.stat(); out += [st.st_mtime_ns, st.st_size]
+            except FileNotFoundError: out += [0, 0]
+        return tuple(out)
+
+    def read(self, file, columns, defaults=None):
+        # gedeeld bestandsslot: een compactie (ook in een ander proces) vervangt werkboek en journaal
+        # onder het exclusieve slot, dus hier nooit het nieuwe werkboek met het oude journaal
+        with FileLock(shared=True), self._lock:
+            if not Path(file).exists():
+                df = pd.DataFrame(defaults, columns=columns) if defaults is not None else pd.DataFrame(columns=columns)
+                self._write_base(file, df)
+            fh = open(file, "rb")
+            jp = journal_path(file)
+            data = jp.read_bytes() if jp.exists() else b""
+        with fh: base = self._read_base(file, fh)
+        return _merge_journal(base, data)
+
+    def write(self, file, df):
+        with self._lock:
+            nxt = self._journal_state(file)["next_id"] if Path(file).exists() else 0
+            self._write_base(file, df)
+            self._write_journal(file, [{"op": "base", "rows": len(df), "ids": _id_runs(np.arange(nxt, nxt + len(df))), "next": nxt + len(df)}])
+
+    def append(self, file, rows):
+        if rows.empty: return
+        with self._lock:
+            if not Path(file).exists(): self.write(file, pd.DataFrame(columns=rows.columns))
+            st = self._journal_state(file)
+            nxt = st["next_id"]; st["next_id"] += len(rows)
+            self._log(file, [{"op": "add", "id": nxt + i, "row": {c: _to_json_value(v) for c, v in zip(rows.columns, r)}}
+                             for i, r in enumerate(rows.itertuples(index=False, name=None))])
+
+    def delete(self, file, ids):
+        # geeft de ids terug die effectief bestonden en nu verwijderd zijn
+        ids = list(dict.fromkeys(int(i) for i in ids))
+        if not ids or not Path(file).exists(): return []
+        wanted = set(ids)
+        with self._lock:
+            self._journal_state(file)
+            header, ops = _parse_journal(journal_path(file).read_bytes())
+            live = set(_base_ids(header)[np.isin(_base_ids(header), ids)].tolist())
+            for op in ops:
+                if op["op"] == "add" and op["id"] in wanted: live.add(op["id"])
+                elif op["op"] == "del": live.discard(op["id"])
+            ids = [i for i in ids if i in live]
+            if ids: self._log(file, [{"op": "del", "id": i} for i in ids])
+        return ids
+
+    def compact(self, file):
+        # geeft False als het werkboek of journaal intussen vervangen werd (volledige schrijfactie,
+        # herstel of een compactie in een ander proces): dan wordt er niets omgewisseld
+        jp = journal_path(file)
+        with FileLock(), self._lock:
+            if not jp.exists() or not Path(file).exists(): return False
+            fh = open(file, "rb"); data = jp.read_bytes()
+        with fh:
+            read_stat = os.fstat(fh.fileno())
+            base = self._read_base(file, fh)
+        merged = _merge_journal(base, data)
+        tmp = _tmp_path(file, ".tmp.xlsx")
+        try:
+            merged.to_excel(tmp, index=False, engine="openpyxl")
+            with FileLock(), self._lock:
+                cur = os.stat(file)
+                with open(jp, "rb") as f: now = f.read()
+                # enkel omwisselen als werkboek en journaalbegin nog dezelfde zijn als wat gelezen werd
+                if (cur.st_ino, cur.st_mtime_ns, cur.st_size) != (read_stat.st_ino, read_stat.st_mtime_ns, read_stat.st_size) \
+                        or not now.startswith(data):
+                    log.info("compactie van %s afgebroken: bestand intussen gewijzigd", file)
+                    return False
+                # wat tijdens de compactie bijkwam, blijft met dezelfde ids in het nieuwe journaal staan
+                _, tail = _parse_journal(now[len(data):])
+                header = {"op": "base", "rows": len(merged), "ids": _id_runs(merged.index), "next": self._journal_state(file)["next_id"]}
+                os.replace(tmp, file)
+                self._write_journal(file, [header] + tail)
+                return True
+        finally:
+            tmp.unlink(missing_ok=True)
+
+    def export_xlsx(self, file):
+        if not Path(file).exists(): return None
+        with self._lock:
+            if self._journal_state(file)["entries"] == 0: return Path(file).read_bytes()
+        buf = io.BytesIO()
+        self.read(file, []).to_excel(buf, index=False, engine="openpyxl")
+        return buf.getvalue()
+
+class SQLiteBackend:
+    name = "sqlite"
+
+    def __init__(self, path=DB_FILE, migrate_from=None):
+        self.path = path
+        self.migrate_from = migrate_from
+        self._lock = threading.Lock()
+        with closing(self._connect()) as con, con:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute('CREATE TABLE IF NOT EXISTS "_versions" ("name" PRIMARY KEY, "version" INTEGER NOT NULL)')
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _exists(self, con, table):
+        return con.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table,)).fetchone() is not None
+
+    def _create(self, con, table, columns):
+        # AUTOINCREMENT: een verwijderd rij-id wordt nooit opnieuw uitgedeeld
+        cols = ", ".join(['"_id" INTEGER PRIMARY KEY AUTOINCREMENT'] + [f'"{c}"' for c in columns])
+        con.execute(f'CREATE TABLE "{table}" ({cols})')
+        for c in INDEXES.get(table, []):
+            if c in columns: con.execute(f'CREATE INDEX IF NOT EXISTS "ix_{table}_{c}" ON "{table}" ("{c}")')
+
+    def _insert(self, con, table, df):
+        if df.empty: return
+        cols = ", ".join(f'"{c}"' for c in df.columns)
+        marks = ", ".join("?" for _ in df.columns)
+        rows = [tuple(_to_sql_value(v) for v in r) for r in df.itertuples(index=False, name=None)]
+        con.executemany(f'INSERT INTO "{table}" ({cols}) VALUES ({marks})', rows)
+
+    def _replace(self, con, table, df):
+        # DROP wist ook de AUTOINCREMENT-teller: die overnemen, zodat ids na een volledige schrijfactie
+        # of herstel verder oplopen en een oud id nooit naar een andere duik wijst
+        seq = con.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table,)).fetchone() \
+            if self._exists(con, "sqlite_sequence") else None
+        con.execute(f'DROP TABLE IF EXISTS "{table}"')
+        self._create(con, table, list(df.columns))
+        if seq: con.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (table, seq[0]))
+        self._insert(con, table, df)
+        self._bump(con, table)
+
+    def _bump(self, con, table):
+        con.execute('INSERT INTO "_versions" VALUES (?, 1) ON CONFLICT("name") DO UPDATE SET "version" = "version" + 1', (table,))
+
+    def version(self, file):
+        with closing(self._connect()) as con:
+            row = con.execute('SELECT "version" FROM "_versions" WHERE "name" = ?', (table_name(file),)).fetchone()
+        return row[0] if row else 0
+
+    def read(self, file, columns, defaults=None):
+        table = table_name(file)
+        with closing(self._connect()) as con:
+            if not self._exists(con, table):
+                # eenmalige migratie: bestaand werkboek overnemen, anders starten met de standaardwaarden.
+                # Het werkboek wordt buiten self._lock gelezen: dat neemt het bestandsslot (vaste volgorde: eerst dat slot).
+                if self.migrate_from is not None and Path(file).exists():
+                    df = self.migrate_from.read(file, columns, defaults)
+                else:
+                    df = pd.DataFrame(defaults, columns=columns) if defaults is not None else pd.DataFrame(columns=columns)
+                with self._lock, con:
+                    if not self._exists(con, table): self._replace(con, table, df)
+        with self._lock, closing(self._connect()) as con:
+            df = pd.read_sql_query(f'SELECT rowid AS "__rowid__", * FROM "{table}" ORDER BY rowid', con)
+        return df.set_index("__rowid__").rename_axis(None).drop(columns=["_id"], errors="ignore")
+
+    def write(self, file, df):
+        with self._lock, closing(self._connect()) as con, con:
+            self._replace(con, table_name(file), df)
+
+    def append(self, file, rows):
+        table = table_name(file)
+        with self._lock, closing(self._connect()) as con, con:
+            if not self._exists(con, table): self._create(con, table, list(rows.columns))
+            self._insert(con, table, rows)
+            self._bump(con, table)
+
+    def delete(self, file, ids):
+        ids = list(dict.fromkeys(int(i) for i in ids))
+        if not ids: return []
+        table = table_name(file)
+        with self._lock, closing(self._connect()) as con, con:
+            marks = ", ".join("?" for _ in ids)
+            ids = [r[0] for r in con.execute(f'SELECT rowid FROM "{table}" WHERE rowid IN ({marks})', ids)]
+            con.executemany(f'DELETE FROM "{table}" WHERE rowid = ?', [(i,) for i in ids])
+            self._bump(con, table)
+        return ids
+
+    def export_xlsx(self, file):
+        table = table_name(file)
+        with closing(self._connect()) as con:
+            if not self._exists(con, table): return None
+            df = pd.read_sql_query(f'SELECT * FROM "{table}" ORDER BY rowid', con).drop(columns=["_id"], errors="ignore")
+        buf = io.BytesIO()
+        df.to_excel(buf, index=False, engine="openpyxl")
+        return buf.getvalue()
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def _make_backend():
+    global _backend
+    _backend = SQLiteBackend(DB_FILE, migrate_from=ExcelBackend()) if STORAGE_BACKEND == "sqlite" else ExcelBackend()
+    return _backend
+
+def get_backend():
+    with _backend_lock:
+        return _backend or _make_backend()
+
+class Writer:
+    def __init__(self, backend, window=WRITE_WINDOW, lock_path=LOCK_FILE):
+        self.backend = backend
+        self.window = window
+        self.lock_path = lock_path
+        # listener(file, before, after, added, removed) na elke weggeschreven groep;
+        # before is None bij een volledige vervanging (write/modify): dan is er geen delta.
+        self.listeners = []
+        self.stats = {"batches": 0, "ops": 0}
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="duikapp-writer")
+        self._thread.start()
+
+    def submit(self, kind, file, payload):
+        fut = Future()
+        self._queue.put((kind, file, payload, fut))
+        return fut
+
+    def append(self, file, rows): return self.submit("append", file, rows)
+    def delete(self, file, ids, rows=None): return self.submit("delete", file, ([int(i) for i in ids], rows))
+    def write(self, file, df): return self.submit("write", file, df)
+    # fn(df) -> (nieuwe df, resultaat): lezen-wijzigen-schrijven op de actuele data, in de schrijver-thread
+    def modify(self, file, fn, columns=(), defaults=None): return self.submit("modify", file, (fn, list(columns), defaults))
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while (left := deadline - time.monotonic()) > 0:
+                try: batch.append(self._queue.get(timeout=left))
+                except queue.Empty: break
+            try: self._commit(batch)
+            except Exception as e:
+                log.exception("schrijven mislukt")
+                for *_, fut in batch:
+                    if not fut.done(): fut.set_exception(e)
+
+    def _commit(self, batch):
+        by_file = {}
+        for item in batch: by_file.setdefault(item[1], []).append(item)
+        done = []
+        with FileLock(self.lock_path):
+            for file, items in by_file.items():
+                # opeenvolgende acties van dezelfde soort worden één backend-aanroep
+                for kind, run in itertools.groupby(items, key=lambda it: it[0]):
+                    run = list(run)
+                    try:
+                        before = self.backend.version(file)
+                        results, added, removed = getattr(self, f"_persist_{kind}")(file, [it[2] for it in run])
+                        after = self.backend.version(file)
+                    except Exception as e:
+                        for *_, fut in run: fut.set_exception(e)
+                        continue
+                    done.append((file, kind, run, results, before, after, added, removed))
+        # listeners pas na het vrijgeven van de bestandslock: een listener mag wachten op een lock
+        # waarvan de houder zelf een gedeelde bestandslock wil (bv. load_settlement -> read)
+        for file, kind, run, results, before, after, added, removed in done:
+            for fn in self.listeners:
+                try: fn(file, None if kind in ("write", "modify") else before, after, added, removed)
+                except Exception: log.exception("listener faalde")
+            self.stats["batches"] += 1; self.stats["ops"] += len(run)
+            for (*_, fut), res in zip(run, results):
+                if isinstance(res, Exception): fut.set_exception(res)
+                else: fut.set_result(res)
+
+    def _persist_append(self, file, payloads):
+        rows = pd.concat(payloads, ignore_index=True) if len(payloads) > 1 else payloads[0]
+        self.backend.append(file, rows)
+        return [None] * len(payloads), rows, None
+
+    def _persist_delete(self, file, payloads):
+        ids = [i for p in payloads for i in p[0]]
+        deleted = self.backend.delete(file, ids)
+        frames = [p[1] for p in payloads if p[1] is not None]
+        removed = None
+        if frames:
+            removed = pd.concat(frames) if len(frames) > 1 else frames[0]
+            removed = removed[~removed.index.duplicated() & removed.index.isin(deleted)]
+        gone = set(deleted)
+        return [[i for i in p[0] if i in gone] for p in payloads], None, removed
+
+    def _persist_write(self, file, payloads):
+        self.backend.write(file, payloads[-1])
+        return [None] * len(payloads), None, None
+
+    def _persist_modify(self, file, payloads):
+        _, columns, defaults = payloads[0]
+        df = self.backend.read(file, columns, defaults)
+        results = []
+        for fn, *_ in payloads:
+            try: df, res = fn(df)
+            except Exception as e: res = e
+            results.append(res)
+        self.backend.write(file, df)
+        return results, None, None
+
+_writer = None
+
+def get_writer():
+    global _writer
+    with _backend_lock:
+        if _writer is None: _writer = Writer(_backend or _make_backend())
+        return _writer
+
+def migrate(files, db_file=DB_FILE, overwrite=False):
+    src, dst = ExcelBackend(), SQLiteBackend(db_file)
+    done = []
+    for file in files:
+        if not Path(file).exists(): continue
+        with closing(dst._connect()) as con:
+            if dst._exists(con, table_name(file)) and not overwrite: continue
+        dst.write(file, src.read(file, []))
+        done.append(file)
+    return done
+
+def export(files, db_file=DB_FILE):
+    src = SQLiteBackend(db_file)
+    done = []
+    for file in files:
+        data = src.export_xlsx(file)
+        if data is None: continue
+        Path(file).write_bytes(data); done.append(file)
+    return done
+
+if __name__ == "__main__":
+    import sys
+    files = ["users.xlsx", "duikers.xlsx", "duikplaatsen.xlsx", "duiken.xlsx"]
+    cmd = sys.argv[1] if len(sys.argv) > 1 else ""
+    if cmd == "migrate":
+        print("Gemigreerd:", ", ".join(migrate(files, overwrite="--overwrite" in sys.argv)) or "niets")
+    elif cmd == "export":
+        print("Geëxporteerd:", ", ".join(export(files)) or "niets")
+    else:
+        print("Gebruik: python storage.py migrate [--overwrite] | export")
@@ -0,0 +1,34 @@
+import sys
+import threading
+from pathlib import Path
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import storage
+import backup
+import exports
+
+@pytest.fixture
+def work(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(storage, "_backend", storage.ExcelBackend())
+    return tmp_path
+
+def test_snapshot_serializes_without_holding_the_file_lock(work, monkeypatch):
+    storage.get_backend().write("duikers.xlsx", pd.DataFrame({"Naam": ["a", "b"]}))
+    frame_xlsx, free = exports.frame_xlsx, []
+    def take_lock():
+        with storage.FileLock(): pass
+    def check_lock(df, sheet):
+        # een schrijver in een andere thread moet het slot nu kunnen nemen
+        t = threading.Thread(target=take_lock, daemon=True)
+        t.start(); t.join(2)
+        free.append(not t.is_alive())
+        return frame_xlsx(df, sheet)
+    monkeypatch.setattr(exports, "frame_xlsx", check_lock)
+    sid = backup.snapshot(["duikers.xlsx"], root="backups")
+    assert free == [True]
+    entry = backup.snapshots("backups")[0]["files"]["duikers.xlsx"]
+    assert backup.snapshots("backups")[0]["id"] == sid and entry["rows"] == 2
+    assert pd.read_excel(Path("backups/objects") / f"{entry['hash']}.xlsx")["Naam"].tolist() == ["a", "b"]
@@ -0,0 +1,28 @@
+import sys
+import datetime
+from pathlib import Path
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import bulk
+
+def dates(values):
+    return [None if pd.isna(v) else v.date().isoformat() for v in bulk._dates(pd.Series(values, dtype=object))]
+
+def test_all_iso_keeps_day_and_month():
+    assert dates(["2024-01-06", "2024-03-04", "2024-12-31"]) == ["2024-01-06", "2024-03-04", "2024-12-31"]
+
+def test_mixed_iso_and_day_first():
+    assert dates(["2024-01-06", "06/01/2024", "2024-03-04", "04/03/2024", "4-3-2024"]) == \
+        ["2024-01-06", "2024-01-06", "2024-03-04", "2024-03-04", "2024-03-04"]
+
+def test_day_first_before_iso():
+    assert dates(["13/01/2024", "2024-01-06"]) == ["2024-01-13", "2024-01-06"]
+
+def test_excel_serials():
+    # 45000 = 15/03/2023 in Excel; ook als tekst (CSV) en als kommagetal
+    assert dates([45000, "45000", 45000.0]) == ["2023-03-15"] * 3
+
+def test_cells_and_invalid():
+    assert dates([datetime.datetime(2024, 1, 6, 14, 30), datetime.date(2024, 3, 4), "geen datum", "", None, 0]) == \
+        ["2024-01-06", "2024-03-04", None, None, None, None]
@@ -0,0 +1,33 @@
+import sys
+import datetime
+from pathlib import Path
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import dives
+import settlement
+
+def raw(datums):
+    return pd.DataFrame({"Datum": datums, "Plaats": "Put", "Duiker": "An"}, index=range(10, 10 + len(datums)), dtype=object)
+
+def test_mixed_iso_formats_from_sqlite():
+    # SQLite: datums zonder tijd als jjjj-mm-dd, met tijd als jjjj-mm-ddTuu:mm:ss
+    tbl = dives.DiveTable(raw(["2024-03-12", "2024-03-14T10:20:00", "2024-03-13", datetime.datetime(2024, 3, 15, 9)]))
+    assert [d.isoformat() for d in tbl.df.index.date] == ["2024-03-12", "2024-03-13", "2024-03-14", "2024-03-15"]
+    assert tbl.df["RowId"].tolist() == [10, 12, 11, 13]
+    assert tbl.invalid.empty
+
+def test_unparseable_dates_are_reported_not_dropped():
+    tbl = dives.DiveTable(raw(["2024-03-12", "rommel", None]))
+    assert len(tbl) == 1
+    assert tbl.invalid.index.tolist() == [11, 12]
+    assert tbl.invalid["Datum"].tolist()[0] == "rommel"
+
+def test_settlement_counts_skipped_dives():
+    tbl = dives.DiveTable(raw(["2024-03-12", "rommel"]))
+    agg = settlement.SettlementAggregate()
+    agg.rebuild(tbl, 1)
+    assert agg.skipped == 1
+    agg.apply(1, 2, added=raw(["31/02/2024", "2024-03-13T08:00:00"]))
+    assert agg.skipped == 2
+    assert agg.period(datetime.date(2024, 3, 1), datetime.date(2024, 3, 31))["AantalDuiken"].tolist() == [2]
@@ -0,0 +1,64 @@
+import sys
+import datetime
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import dives
+import settlement
+
+PLACES = ["Put", "Meer", "Zee", None]
+DIVERS = ["An", "Bert", "Cas", "Dirk", None]
+
+def rows(rng, n, places=PLACES, divers=DIVERS, start=0):
+    first = datetime.date(2023, 1, 1)
+    return pd.DataFrame({
+        "Datum": [first + datetime.timedelta(days=int(d)) for d in rng.integers(0, 730, n)],
+        "Plaats": [places[i] for i in rng.integers(0, len(places), n)],
+        "Duiker": [divers[i] for i in rng.integers(0, len(divers), n)],
+    }, index=range(start, start + n), dtype=object)
+
+def expected(raw, start, end, plaats):
+    # de oude berekening: filteren en groupby("Duiker").size()
+    d = pd.to_datetime(raw["Datum"]).dt.date
+    sub = raw[(d >= start) & (d <= end)]
+    if plaats is not None: sub = sub[sub["Plaats"] == plaats]
+    per = sub.groupby("Duiker").size()
+    return {str(k): int(v) for k, v in per.items() if v > 0}
+
+def check(agg, raw, rng, queries=100):
+    first = datetime.date(2022, 12, 1)
+    for _ in range(queries):
+        a, b = sorted(int(x) for x in rng.integers(0, 800, 2))
+        start, end = first + datetime.timedelta(days=a), first + datetime.timedelta(days=b)
+        plaats = [None, "Put", "Meer", "Zee", "Nieuw", "Onbekend"][int(rng.integers(0, 6))]
+        per = agg.period(start, end, plaats=plaats)
+        assert per["Duiker"].tolist() == sorted(per["Duiker"].tolist(), key=str)
+        assert dict(zip(per["Duiker"], per["AantalDuiken"].astype(int))) == expected(raw, start, end, plaats), (start, end, plaats)
+
+def test_period_matches_groupby_after_rebuild_and_apply():
+    rng = np.random.default_rng(7)
+    raw = rows(rng, 2000)
+    agg = settlement.SettlementAggregate()
+    agg.rebuild(dives.DiveTable(raw), 1)
+    check(agg, raw, rng)
+
+    # nieuwe duikers en een nieuwe plaats, plus rijen zonder plaats
+    added = rows(rng, 300, places=["Nieuw", "Put", None], divers=["Eva", "An", "Fien"], start=len(raw))
+    assert agg.apply(1, 2, added=added)
+    raw = pd.concat([raw, added])
+    check(agg, raw, rng)
+
+    removed = raw.iloc[rng.choice(len(raw), 500, replace=False)]
+    assert agg.apply(2, 3, removed=removed)
+    raw = raw.drop(index=removed.index)
+    check(agg, raw, rng)
+    assert agg.check(dives.DiveTable(raw)) == []
+
+def test_apply_with_an_unexpected_version_forces_a_rebuild():
+    rng = np.random.default_rng(1)
+    agg = settlement.SettlementAggregate()
+    agg.rebuild(dives.DiveTable(rows(rng, 50)), 1)
+    assert not agg.apply(5, 6, added=rows(rng, 5, start=50))
+    assert agg.version is None
@@ -0,0 +1,125 @@
+import os
+import sys
+import time
+import threading
+import multiprocessing
+from pathlib import Path
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import storage
+
+@pytest.fixture
+def work(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+def names(backend, file):
+    return backend.read(file, ["Naam"])["Naam"].tolist()
+
+def test_write_during_compaction_is_not_undone(work, monkeypatch):
+    backend = storage.ExcelBackend(compact_at=10**9)
+    backend.write("duikers.xlsx", pd.DataFrame({"Naam": ["n0"]}))
+    backend.append("duikers.xlsx", pd.DataFrame({"Naam": [f"n{i}" for i in range(1, 5)]}))
+    merge = storage._merge_journal
+    def merge_then_restore(base, data):
+        # een volledige schrijfactie (bv. herstel) tussen het lezen en het omwisselen
+        out = merge(base, data)
+        backend.write("duikers.xlsx", pd.DataFrame({"Naam": ["RESTORED"]}))
+        return out
+    monkeypatch.setattr(storage, "_merge_journal", merge_then_restore)
+    assert backend.compact("duikers.xlsx") is False
+    monkeypatch.setattr(storage, "_merge_journal", merge)
+    assert names(backend, "duikers.xlsx") == ["RESTORED"]
+    assert not list(work.glob("*.tmp*"))
+
+def test_appends_during_compaction_are_kept(work, monkeypatch):
+    backend = storage.ExcelBackend(compact_at=10**9)
+    backend.write("duikers.xlsx", pd.DataFrame({"Naam": ["n0"]}))
+    backend.append("duikers.xlsx", pd.DataFrame({"Naam": ["n1"]}))
+    merge = storage._merge_journal
+    def merge_then_append(base, data):
+        out = merge(base, data)
+        backend.append("duikers.xlsx", pd.DataFrame({"Naam": ["n2"]}))
+        return out
+    monkeypatch.setattr(storage, "_merge_journal", merge_then_append)
+    assert backend.compact("duikers.xlsx") is True
+    monkeypatch.setattr(storage, "_merge_journal", merge)
+    assert names(backend, "duikers.xlsx") == ["n0", "n1", "n2"]
+
+def _appender(root, worker, n, slow=False):
+    os.chdir(root)
+    if slow:
+        # het venster tussen het vervangen van werkboek en journaal vergroten
+        write_journal = storage.ExcelBackend._write_journal
+        def slow_write_journal(self, file, ops):
+            time.sleep(0.05); write_journal(self, file, ops)
+        storage.ExcelBackend._write_journal = slow_write_journal
+    backend = storage.ExcelBackend(compact_at=40)
+    writer = storage.Writer(backend, window=0)
+    for i in range(n):
+        writer.append("duikers.xlsx", pd.DataFrame({"Naam": [f"w{worker}-{i}"]})).result()
+    # lopende compacties laten afronden voor het proces stopt
+    while backend._compacting: pass
+
+def test_concurrent_processes_with_compaction(work):
+    storage.ExcelBackend().write("duikers.xlsx", pd.DataFrame({"Naam": []}))
+    ctx = multiprocessing.get_context("spawn")
+    procs = [ctx.Process(target=_appender, args=(str(work), w, 120)) for w in range(3)]
+    for p in procs: p.start()
+    for p in procs: p.join(120); assert p.exitcode == 0
+    backend = storage.ExcelBackend(compact_at=10**9)
+    got = names(backend, "duikers.xlsx")
+    assert sorted(got) == sorted(f"w{w}-{i}" for w in range(3) for i in range(120))
+    backend.compact("duikers.xlsx")
+    assert sorted(pd.read_excel("duikers.xlsx")["Naam"]) == sorted(got)
+    assert not list(work.glob("*.tmp*"))
+
+def test_reads_never_mix_workbook_and_journal_during_compaction(work):
+    storage.ExcelBackend().write("duikers.xlsx", pd.DataFrame({"Naam": []}))
+    ctx = multiprocessing.get_context("spawn")
+    proc = ctx.Process(target=_appender, args=(str(work), 0, 300, True))
+    proc.start()
+    backend = storage.ExcelBackend(compact_at=10**9)
+    seen = 0
+    while proc.is_alive() or seen == 0:
+        got = names(backend, "duikers.xlsx")
+        # elke lezing is een consistente toestand: de eerste k toevoegingen, zonder dubbels of gaten
+        assert got == [f"w0-{i}" for i in range(len(got))]
+        seen += 1
+    proc.join(); assert proc.exitcode == 0
+    assert len(names(backend, "duikers.xlsx")) == 300
+
+def test_sqlite_ids_stay_monotonic_after_full_write(work):
+    backend = storage.SQLiteBackend("t.db")
+    backend.write("duiken.xlsx", pd.DataFrame({"Duiker": ["a", "b", "c"]}))
+    before = backend.read("duiken.xlsx", ["Duiker"]).index.tolist()
+    backend.write("duiken.xlsx", pd.DataFrame({"Duiker": ["x", "y"]}))
+    after = backend.read("duiken.xlsx", ["Duiker"]).index.tolist()
+    assert min(after) > max(before)
+    backend.append("duiken.xlsx", pd.DataFrame({"Duiker": ["z"]}))
+    assert backend.read("duiken.xlsx", ["Duiker"]).index.tolist() == after + [max(after) + 1]
+
+def test_listener_waiting_on_a_reader_does_not_deadlock(work):
+    # zoals load_settlement: een lezer houdt een lock vast terwijl hij leest, en de listener
+    # van de schrijver wacht op datzelfde lock
+    backend = storage.ExcelBackend(compact_at=10**9)
+    backend.write("duikers.xlsx", pd.DataFrame({"Naam": ["n0"]}))
+    writer = storage.Writer(backend, window=0)
+    agg_lock, held, in_listener = threading.Lock(), threading.Event(), threading.Event()
+    def listener(*_):
+        in_listener.set()
+        with agg_lock: pass
+    writer.listeners.append(listener)
+    got = []
+    def reader():
+        with agg_lock:
+            held.set(); in_listener.wait(10)
+            got.append(names(backend, "duikers.xlsx"))
+    t = threading.Thread(target=reader, daemon=True)
+    t.start(); held.wait(10)
+    fut = writer.append("duikers.xlsx", pd.DataFrame({"Naam": ["n1"]}))
+    fut.result(timeout=10)
+    t.join(10)
+    assert got == [["n0", "n1"]]